@@ -0,0 +1,152 @@
+"""Benchmark keyword categorization: per-category keyword loop vs the Aho-Corasick keyword index.
+
+Usage: python benchmark_keyword_matching.py [--count 5000] [--merchants 0,10000,100000]
+
+Categorizes synthetic item descriptions (category keywords, fragments of them,
+merchant names and noise words, in mixed case) with the previous
+keyword_categorize, which tested every keyword and keyword word of every
+category and then every dictionary merchant against the text, and with
+AdvancedCategorizer.keyword_categorize, for dictionaries of several sizes.
+Reports the per-item latency and asserts that both return the same result on
+every item the baseline categorized (all of them without merchants, a 500-item
+sample once merchants are loaded). Importing main initializes the API
+components, so the first run prints the usual startup messages.
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from main import MerchantDictionary, categorizer
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ten', 'ro', 'zu', 'bar', 'ne', 'vi', 'sta', 'qu', 'dor', 'fin', 'el', 'ix']
+NOISE = ['the', 'pay', 'xyz', 'store', '#12', 'on', '10/12', 'ref', '-', 'pos']
+
+
+def synthetic_merchants(path: str, count: int, rng):
+    """CSV merchant dictionary of made-up names spread over the built-in categories"""
+    categories = list(categorizer.expense_categories)
+    names = set()
+    while len(names) < count:
+        names.add(' '.join(''.join(rng.choice(SYLLABLES, size=rng.integers(2, 5)))
+                           for _ in range(rng.integers(1, 4))))
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'category'])
+        for name in sorted(names):
+            writer.writerow([name.upper(), rng.choice(categories)])
+    return sorted(names)
+
+
+def synthetic_items(count: int, merchants, rng):
+    """Descriptions mixing whole keywords, truncated keyword words, merchant names and noise"""
+    words = [word for info in categorizer.expense_categories.values()
+             for keyword in info['keywords'] for word in [keyword] + keyword.split()]
+    items = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.integers(0, 6)):
+            kind = rng.random()
+            if kind < 0.6:
+                word = str(rng.choice(words))
+                parts.append(word[:rng.integers(1, len(word) + 1)])
+            elif kind < 0.75 and merchants:
+                parts.append(str(rng.choice(merchants)))
+            else:
+                parts.append(str(rng.choice(NOISE)))
+        item = ' '.join(parts)
+        items.append(item.upper() if rng.random() < 0.3 else item)
+    return items
+
+
+def merchant_named(name: str, text: str) -> bool:
+    """Whether name occurs in text on alphanumeric word boundaries"""
+    start = text.find(name)
+    while start != -1:
+        end = start + len(name)
+        if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+            return True
+        start = text.find(name, start + 1)
+    return False
+
+
+def baseline_categorize(categorizer, merchants, item_description, transaction_type):
+    """Keyword categorization as computed before the keyword index"""
+    item_lower = item_description.lower().strip()
+    categories = categorizer.expense_categories if transaction_type == 'expense' else {}
+
+    category_scores = {}
+    for category, info in categories.items():
+        score = 0
+        matched_keywords = []
+        for keyword in info['keywords']:
+            if keyword in item_lower:
+                score += len(keyword) * 2
+                matched_keywords.append(keyword)
+            elif any(word in item_lower for word in keyword.split()):
+                score += 1
+                matched_keywords.append(keyword)
+        category_scores[category] = {'score': score, 'matched_keywords': matched_keywords}
+
+    for name in merchants.rank:
+        category = merchants.category(name)
+        if category in categories and merchant_named(name, item_lower):
+            category_scores[category]['score'] += len(name) * 2
+            category_scores[category]['matched_keywords'].append(name)
+
+    category_scores = {category: match for category, match in category_scores.items() if match['score'] > 0}
+    if category_scores:
+        best_category = max(category_scores.keys(), key=lambda x: category_scores[x]['score'])
+        confidence = min(category_scores[best_category]['score'] * 0.1, 0.8)
+        return {
+            'category': best_category,
+            'confidence': confidence,
+            'reasoning': f"Keyword match: {', '.join(category_scores[best_category]['matched_keywords'][:3])}"
+        }
+
+    return {'category': 'Extra', 'confidence': 0.2, 'reasoning': 'No keywords matched, using default'}
+
+
+def run(count: int, sizes):
+    print(f"{'merchants':>9} {'path':>9} {'median us':>10} {'p99 us':>8}")
+    for size in sizes:
+        rng = np.random.default_rng(size)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'merchants.csv')
+            names = synthetic_merchants(path, size, rng) if size else []
+            merchants = MerchantDictionary(path if size else None)
+        categorizer.merchants = merchants
+        items = synthetic_items(count, names, rng)
+        types = ['expense' if rng.random() < 0.9 else 'income' for _ in items]
+
+        # The baseline scans every merchant per item, so it only runs on a sample once there are merchants
+        sample = min(count, 500) if size else count
+        paths = {
+            'baseline': lambda item, kind: baseline_categorize(categorizer, merchants, item, kind),
+            'index': categorizer.keyword_categorize,
+        }
+        results = {}
+        for name, categorize in paths.items():
+            latencies = []
+            results[name] = []
+            for item, kind in list(zip(items, types))[:sample if name == 'baseline' else count]:
+                start = time.perf_counter()
+                results[name].append(categorize(item, kind))
+                latencies.append((time.perf_counter() - start) * 1e6)
+            print(f"{size:>9} {name:>9} {np.median(latencies):>10.1f} {np.percentile(latencies, 99):>8.1f}")
+
+        mismatches = [item for item, expected, actual in zip(items, results['baseline'], results['index'])
+                      if expected != actual]
+        assert not mismatches, f'{len(mismatches)}/{sample} items differ, first: {mismatches[0]!r}'
+        print(f"{size:>9} keyword index matches the baseline on {sample}/{sample} items")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--merchants', default='0,10000,100000', help='comma-separated merchant dictionary sizes')
+    args = parser.parse_args()
+    run(args.count, [int(size) for size in args.merchants.split(',')])
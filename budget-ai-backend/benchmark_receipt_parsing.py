@@ -0,0 +1,181 @@
+"""Benchmark receipt text parsing: per-pattern extraction vs the single-pass ReceiptScanner.
+
+Usage: python benchmark_receipt_parsing.py [--count 200] [--sizes 1,10,100] [--check 20000]
+
+Parses synthetic OCR text dumps (noisy receipts, several receipts per dump for
+the larger sizes, as from multi-page scans) with the previous extract_best_*
+methods, which ran each amount and date pattern separately, and with
+ReceiptScanner.scan, and reports throughput and how often the results agree.
+It then feeds both parsers token soup built from keywords, amounts, dates and
+separators, which is harsher than the receipts, and asserts that the scanner
+returns the same amount and date on every text. Importing main initializes the API components, so the first run prints the
+usual startup messages.
+"""
+import argparse
+import re
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from main import EnhancedReceiptProcessor
+
+VENDORS = ['WALMART', 'KROGER', 'SHELL', 'STARBUCKS', 'HOME DEPOT', 'CORNER MARKET', 'MAIN ST GRILL']
+ITEMS = ['MILK', 'BREAD', 'EGGS', 'COFFEE', 'BANANAS', 'CHEESE', 'RICE', 'SOAP', 'PAPER TOWELS', 'JUICE']
+DATE_FORMATS = ['%m/%d/%Y', '%Y-%m-%d', '%m-%d-%y', '%b %d, %Y', '%d %B %Y']
+
+AMOUNT_PATTERNS = [
+    r'TOTAL[:\s]*\$?\s*(\d+\.\d{2})',
+    r'AMOUNT[:\s]*\$?\s*(\d+\.\d{2})',
+    r'SUBTOTAL[:\s]*\$?\s*(\d+\.\d{2})',
+    r'\$\s*(\d+\.\d{2})',
+    r'(\d+\.\d{2})'
+]
+CHECK_TOKENS = ['TOTAL', 'SUBTOTAL', 'Amount due', 'BALANCE', '$', ' ', '  ', '\n', ':', 'walmart', 'Shell Station',
+                'Corner Market', 'THANK YOU', 'Dec', 'March', '-', '/', ',', 'x', 'Receipt']
+CHECK_DATE_FORMATS = DATE_FORMATS + ['%y/%m/%d', '%m/%d-%Y']
+DATE_PATTERNS = [
+    r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+    r'(\d{4}[/-]\d{1,2}[/-]\d{1,2})',
+    r'(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[^\d]*(\d{1,2})[^\d]*(\d{4})',
+    r'(\d{1,2})[^\d]+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[^\d]+(\d{4})'
+]
+
+
+def synthetic_receipt(rng) -> str:
+    """OCR-like receipt text: header, item lines, totals, and a few misread characters"""
+    date = datetime.now() - timedelta(days=int(rng.integers(0, 600)))
+    lines = [str(rng.choice(VENDORS)), f'STORE #{rng.integers(100, 999)} TEL 555-{rng.integers(1000, 9999)}',
+             date.strftime(str(rng.choice(DATE_FORMATS))) + f' {rng.integers(0, 24):02d}:{rng.integers(0, 60):02d}']
+    subtotal = 0.0
+    for item in rng.choice(ITEMS, size=rng.integers(3, 9)):
+        quantity = int(rng.integers(1, 4))
+        price = round(float(rng.uniform(0.5, 25)), 2)
+        subtotal += quantity * price
+        lines.append(f'{item} {quantity} @ {price:.2f}   {quantity * price:.2f}')
+    tax = round(subtotal * 0.08, 2)
+    lines += [f'SUBTOTAL {subtotal:.2f}', f'TAX {tax:.2f}', f'TOTAL ${subtotal + tax:.2f}',
+              f'CASH {subtotal + tax + float(rng.uniform(0, 20)):.2f}', 'THANK YOU']
+
+    text = list('\n'.join(lines))
+    for position in rng.integers(0, len(text), size=len(text) // 60):
+        text[position] = str(rng.choice(list('|.,:;Il0O ')))
+    return ''.join(text)
+
+
+def adversarial_text(rng) -> str:
+    """Random mix of receipt keywords, separators, amounts, bare numbers and dates in and out of range"""
+    pieces = []
+    for _ in range(rng.integers(0, 60)):
+        kind = rng.random()
+        if kind < 0.6:
+            pieces.append(str(rng.choice(CHECK_TOKENS)))
+        elif kind < 0.72:
+            pieces.append(f'{rng.uniform(0, 20000):.2f}')
+        elif kind < 0.76:
+            pieces.append(f'{rng.uniform(0, 2):.3f}')
+        elif kind < 0.82:
+            date = datetime.now() - timedelta(days=int(rng.integers(-60, 900)))
+            pieces.append(date.strftime(str(rng.choice(CHECK_DATE_FORMATS))))
+        else:
+            pieces.append(str(rng.integers(0, 3000)))
+    text = ''.join(pieces)
+    return text.upper() if rng.random() < 0.5 else text
+
+
+def baseline_parse(processor, text):
+    """Amount, date and vendor as extracted before the single-pass scanner"""
+    lines = text.split('\n')
+    amount_candidates = []
+    for i, line in enumerate(lines):
+        line_lower = line.lower()
+        for pattern in AMOUNT_PATTERNS:
+            for match in re.findall(pattern, line, re.IGNORECASE):
+                amount = float(match)
+                score = 0
+                if any(keyword in line_lower for keyword in ['total', 'amount', 'due', 'balance']):
+                    score += 20
+                if i >= len(lines) * 0.7:
+                    score += 10
+                if 1 <= amount <= 10000:
+                    score += 5
+                if amount > 0.5:
+                    score += 3
+                amount_candidates.append((amount, score, line))
+    amount_candidates.sort(key=lambda x: x[1], reverse=True)
+
+    best_date = None
+    today = datetime.now()
+    for pattern in DATE_PATTERNS:
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            for fmt in ['%m/%d/%Y', '%m-%d-%Y', '%Y/%m/%d', '%Y-%m-%d', '%m/%d/%y', '%m-%d-%y', '%y/%m/%d',
+                        '%y-%m-%d', '%b %d %Y', '%B %d %Y', '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y']:
+                try:
+                    parsed_date = datetime.strptime(re.sub(r'[^\w\s/\-,]', '', match.group()).strip(), fmt)
+                except ValueError:
+                    continue
+                if (today - timedelta(days=365*2)) <= parsed_date <= (today + timedelta(days=30)):
+                    best_date = parsed_date.strftime('%Y-%m-%d')
+                    break
+            if best_date:
+                break
+        if best_date:
+            break
+
+    return {
+        'amount': amount_candidates[0][0] if amount_candidates else None,
+        'date': best_date,
+        'vendor': processor.scanner.find_vendor(text)
+    }
+
+
+def check(processor, count: int):
+    """Raise unless the scanner picks the same amount and date as the baseline on every adversarial text"""
+    rng = np.random.default_rng(0)
+    mismatches = []
+    for _ in range(count):
+        text = adversarial_text(rng)
+        expected = baseline_parse(processor, text)
+        scanned = processor.scanner.scan(text)
+        if (scanned['amount'], scanned['date']) != (expected['amount'], expected['date']):
+            mismatches.append(text)
+    assert not mismatches, f'{len(mismatches)}/{count} texts differ, first: {mismatches[0]!r}'
+    print(f'scanner matches the per-pattern extractors on {count}/{count} adversarial texts')
+
+
+def run(count: int, sizes, check_count: int):
+    processor = EnhancedReceiptProcessor()
+    parsers = {
+        'baseline': lambda text: baseline_parse(processor, text),
+        'scanner': processor.scanner.scan,
+    }
+
+    print(f"{'receipts':>8} {'KB/dump':>8} {'parser':>9} {'median ms':>10} {'MB/s':>7} {'agree':>7}")
+    for size in sizes:
+        rng = np.random.default_rng(size)
+        dumps = ['\n'.join(synthetic_receipt(rng) for _ in range(size)) for _ in range(count)]
+        kilobytes = np.mean([len(dump) for dump in dumps]) / 1024
+        results = {}
+        for name, parse in parsers.items():
+            latencies = []
+            results[name] = []
+            for dump in dumps:
+                start = time.perf_counter()
+                results[name].append(parse(dump))
+                latencies.append((time.perf_counter() - start) * 1000)
+            agree = np.mean([result == expected for result, expected in zip(results[name], results['baseline'])])
+            throughput = sum(len(dump) for dump in dumps) / 1e6 / (sum(latencies) / 1000)
+            print(f"{size:>8} {kilobytes:>8.1f} {name:>9} {np.median(latencies):>10.3f} {throughput:>7.1f} {agree:>7.1%}")
+            assert agree == 1, f'{name} disagrees with the baseline on {1 - agree:.1%} of {size}-receipt dumps'
+
+    check(processor, check_count)
+    processor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--sizes', default='1,10,100', help='comma-separated receipts per OCR text dump')
+    parser.add_argument('--check', type=int, default=20000, help='adversarial texts for the equivalence check')
+    args = parser.parse_args()
+    run(args.count, [int(size) for size in args.sizes.split(',')], args.check)
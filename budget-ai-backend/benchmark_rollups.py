@@ -0,0 +1,92 @@
+"""Benchmark insight aggregates: raw-row compute_aggregates vs the materialized SpendingRollups.
+
+Usage: python benchmark_rollups.py [--sizes 1000,10000,50000]
+
+Stores synthetic histories (some rows uncategorized or undated) in a scratch
+SQLite file, folding half of them into the rollups with a rebuild and the rest
+one learn at a time, then times both aggregate paths and asserts that they
+agree on every statistic the analyzers read. Importing main initializes the
+API components, so the first run prints the usual startup messages.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from compute_jobs import InsightsEngine
+from main import SpendingRollups, TransactionStore
+
+CATEGORIES = ['Groceries', 'Dining', 'Transport', 'Utilities', 'Shopping', None, '']
+
+
+def synthetic_records(count: int, seed: int):
+    """Learned-transaction records with a share of missing categories and dates"""
+    rng = np.random.default_rng(seed)
+    start = datetime(2023, 1, 1)
+    for index in range(count):
+        date = start + timedelta(days=int(rng.integers(0, 730)))
+        yield {
+            'user_id': 'benchmark',
+            'item': f'item {index}',
+            'amount': round(float(rng.lognormal(3, 1)), 2),
+            'category': CATEGORIES[rng.integers(0, len(CATEGORIES))],
+            'type': 'expense',
+            'date': None if rng.random() < 0.05 else date.strftime('%Y-%m-%d')
+        }
+
+
+def assert_parity(expected, actual):
+    """Raise if the rollup bundle differs from compute_aggregates on any shared statistic"""
+    assert actual['count'] == expected['count'], (actual['count'], expected['count'])
+    for key in ('weekday_mean', 'month_mean'):
+        pd.testing.assert_series_equal(actual[key].sort_index(), expected[key].sort_index(),
+                                       check_names=False, check_index_type=False)
+    # compute_aggregates keys the categories by a CategoricalIndex in first-seen order
+    category_stats = [stats.set_axis(stats.index.astype(str)).sort_index()
+                      for stats in (actual['category_stats'], expected['category_stats'])]
+    pd.testing.assert_frame_equal(*category_stats, check_dtype=False, check_index_type=False)
+    pd.testing.assert_frame_equal(actual['daily_spending'].reset_index(drop=True),
+                                  expected['daily_spending'].reset_index(drop=True), check_dtype=False)
+
+
+def run(sizes):
+    engine = InsightsEngine()
+
+    print(f"{'rows':>8} {'path':>8} {'median ms':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            store = TransactionStore(os.path.join(directory, 'rollups.db'))
+            records = list(synthetic_records(size, size))
+            for record in records[:size // 2]:
+                store.add(record)
+            rollups = SpendingRollups(store)
+            for record in records[size // 2:]:
+                store.add(record)
+                rollups.add(record)
+
+            paths = {
+                'raw': lambda: engine.compute_aggregates(store.get_columns('benchmark').to_frame()),
+                'rollups': lambda: rollups.get_aggregates('benchmark'),
+            }
+            results = {}
+            for name, aggregate in paths.items():
+                latencies = []
+                for _ in range(5):
+                    start = time.perf_counter()
+                    results[name] = aggregate()
+                    latencies.append((time.perf_counter() - start) * 1000)
+                print(f"{size:>8} {name:>8} {np.median(latencies):>10.3f}")
+            assert_parity(results['raw'], results['rollups'])
+            store.connection.close()
+    print('rollup aggregates match compute_aggregates at every size')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,50000', help='comma-separated rows per stored history')
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(',')])
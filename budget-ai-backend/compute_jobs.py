@@ -0,0 +1,1156 @@
+"""CPU-bound request work run by the API's compute pool.
+
+Worker processes import only this module, so spawn and forkserver workers
+start without loading BERT, opening the learning store or building the
+rollups. main.py imports the shared classes from here.
+"""
+from typing import Optional, List, Dict, Any, Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict
+import os
+import sys
+import platform
+import time
+import threading
+import hashlib
+import json
+from datetime import timedelta
+import cv2
+import numpy as np
+import pandas as pd
+import pytesseract
+from sklearn.ensemble import IsolationForest
+from prophet import Prophet
+import warnings
+warnings.filterwarnings('ignore')
+
+# Auto-detect Tesseract installation
+if platform.system() == "Windows":
+    possible_paths = [
+        r"C:\Program Files\Tesseract-OCR\tesseract.exe",
+        r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
+        r"C:\Users\{}\AppData\Local\Programs\Tesseract-OCR\tesseract.exe".format(os.getenv('USERNAME'))
+    ]
+    for path in possible_paths:
+        if os.path.exists(path):
+            pytesseract.pytesseract.tesseract_cmd = path
+            break
+
+# Fitted Prophet models cached per (user, category, series) in each worker; small data extensions refit in the background
+PROPHET_CACHE_SIZE = int(os.getenv('PROPHET_CACHE_SIZE', '128'))
+PROPHET_CACHE_TTL = float(os.getenv('PROPHET_CACHE_TTL', '3600'))
+PROPHET_WARM_START_MAX_NEW_DAYS = int(os.getenv('PROPHET_WARM_START_MAX_NEW_DAYS', '7'))
+
+# Forecast engine: 'auto' uses Holt-Winters below FORECAST_PROPHET_MIN_DAYS of history, Prophet above
+FORECAST_ENGINE = os.getenv('FORECAST_ENGINE', 'auto')
+FORECAST_PROPHET_MIN_DAYS = int(os.getenv('FORECAST_PROPHET_MIN_DAYS', '180'))
+
+# Tesseract page-segmentation configs run concurrently; stop once one reaches this mean word confidence (0-100)
+OCR_CONFIG_WORKERS = int(os.getenv('OCR_CONFIG_WORKERS', '4'))
+OCR_EARLY_EXIT_CONFIDENCE = float(os.getenv('OCR_EARLY_EXIT_CONFIDENCE', '80'))
+
+# Receipt preprocessing: images wider than OCR_MAX_WIDTH are shrunk before filtering, and narrower than
+# OCR_TARGET_WIDTH have their thresholded result enlarged to it;
+# OCR_DENOISE is one of bilateral, median, gaussian or none. Median is much faster than the original
+# bilateral filter but its OCR accuracy has not been compared yet (benchmark_preprocessing.py)
+OCR_TARGET_WIDTH = int(os.getenv('OCR_TARGET_WIDTH', '1200'))
+OCR_MAX_WIDTH = int(os.getenv('OCR_MAX_WIDTH', '1600'))
+OCR_DENOISE = os.getenv('OCR_DENOISE', 'bilateral')
+
+# Opt-in: crop photos to the detected receipt (perspective corrected), and with OCR_REGION=full to its
+# text block or with OCR_REGION=bottom to the lower OCR_BOTTOM_FRACTION of it, where totals are.
+# Both change what Tesseract sees and stay off until benchmark_preprocessing.py shows no accuracy loss
+OCR_DETECT_RECEIPT = os.getenv('OCR_DETECT_RECEIPT', 'false').lower() == 'true'
+OCR_REGION = os.getenv('OCR_REGION', 'none')
+OCR_BOTTOM_FRACTION = float(os.getenv('OCR_BOTTOM_FRACTION', '0.4'))
+
+# Streaming NDJSON/CSV uploads and stored histories are parsed in chunks of this many rows into NumPy columns
+STREAM_CHUNK_ROWS = int(os.getenv('STREAM_CHUNK_ROWS', '8192'))
+
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Typed column container for transactions; converts to pandas without copying the numeric columns
+class TransactionColumns:
+    categorical_fields = ('category', 'type', 'user_id')
+
+    def __init__(self, items: np.ndarray, amounts: np.ndarray, dates: np.ndarray,
+                 codes: Dict[str, np.ndarray], labels: Dict[str, List[str]]):
+        self.items = items
+        self.amounts = amounts
+        self.dates = dates
+        self.codes = codes
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> 'TransactionColumns':
+        """Columns from payload-shaped dicts, parsing every date in one vectorized call"""
+        buffer = TransactionBuffer(max(1, len(records)))
+        for record in records:
+            buffer.append(record)
+        return buffer.to_columns()
+
+    @property
+    def nbytes(self) -> int:
+        """Column memory; interned item strings are counted once"""
+        unique_items = {id(item): item for item in self.items}
+        return (self.amounts.nbytes + self.dates.nbytes + self.items.nbytes
+                + sum(codes.nbytes for codes in self.codes.values())
+                + sum(sys.getsizeof(item) for item in unique_items.values()))
+
+    def code(self, field: str, label: str) -> int:
+        try:
+            return self.labels[field].index(label)
+        except ValueError:
+            return -1
+
+    def select(self, mask: np.ndarray) -> 'TransactionColumns':
+        return TransactionColumns(self.items[mask], self.amounts[mask], self.dates[mask],
+                                  {field: codes[mask] for field, codes in self.codes.items()}, self.labels)
+
+    def filter_category(self, category: str) -> 'TransactionColumns':
+        """Rows of one category, compared as an integer code rather than per-row strings"""
+        return self.select(self.codes['category'] == self.code('category', category))
+
+    def categorical(self, field: str) -> pd.Categorical:
+        return pd.Categorical.from_codes(self.codes[field], self.labels[field])
+
+    def row(self, index: int) -> Dict:
+        record = {'item': self.items[index], 'amount': float(self.amounts[index])}
+        for field in self.categorical_fields:
+            code = self.codes[field][index]
+            record[field] = self.labels[field][code] if code >= 0 else None
+        return record
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame over the same arrays, in the shape the insight and forecast code expects"""
+        return pd.DataFrame({
+            'item': self.items,
+            'amount': self.amounts,
+            'category': self.categorical('category'),
+            'type': self.categorical('type'),
+            'date': self.dates
+        }, copy=False)
+
+    def daily_totals(self, category: str = None) -> pd.DataFrame:
+        """Daily spending in the forecasters' (ds, y) shape straight from the arrays"""
+        columns = self.filter_category(category) if category else self
+        days = columns.dates.astype('datetime64[D]')
+        dated = ~np.isnat(days)
+        unique_days, inverse = np.unique(days[dated], return_inverse=True)
+        totals = np.bincount(inverse, weights=columns.amounts[dated], minlength=len(unique_days))
+        return pd.DataFrame({'ds': unique_days.astype('datetime64[ns]'), 'y': totals})
+
+    def fingerprint(self) -> str:
+        """Content hash over every column, used as a cache key"""
+        digest = hashlib.sha256()
+        for column in (self.amounts, self.dates.view(np.int64), *(self.codes[field] for field in self.categorical_fields)):
+            digest.update(np.ascontiguousarray(column).tobytes())
+        digest.update(json.dumps(self.labels, sort_keys=True).encode('utf-8'))
+        digest.update('\x1f'.join(self.items).encode('utf-8'))
+        return digest.hexdigest()
+
+# Growable columns filled in chunks; pending rows are parsed together when a chunk fills
+class TransactionBuffer:
+    def __init__(self, capacity: int = STREAM_CHUNK_ROWS):
+        self.size = 0
+        self.amounts = np.empty(capacity, dtype=np.float64)
+        self.dates = np.empty(capacity, dtype='datetime64[ns]')
+        self.items = np.empty(capacity, dtype=object)
+        self.codes = {field: np.empty(capacity, dtype=np.int32) for field in TransactionColumns.categorical_fields}
+        self.vocabularies = {field: {} for field in TransactionColumns.categorical_fields}
+        self.pending = []
+
+    def __len__(self):
+        return self.size + len(self.pending)
+
+    def append(self, record: Dict):
+        self.pending.append(record)
+        if len(self.pending) >= STREAM_CHUNK_ROWS:
+            self.flush()
+
+    def ensure_capacity(self, extra: int):
+        needed = self.size + extra
+        if needed <= len(self.amounts):
+            return
+        capacity = max(needed, 2 * len(self.amounts))
+        
+        def grow(column):
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            return grown
+        
+        self.amounts, self.dates, self.items = grow(self.amounts), grow(self.dates), grow(self.items)
+        self.codes = {field: grow(codes) for field, codes in self.codes.items()}
+
+    @staticmethod
+    def encode(values, vocabulary: Dict[str, int]) -> np.ndarray:
+        """Categorical codes, -1 for missing; the vocabulary grows as new labels appear"""
+        return np.fromiter(
+            (-1 if not value else vocabulary.setdefault(str(value), len(vocabulary)) for value in values),
+            dtype=np.int32, count=len(values)
+        )
+
+    def flush(self):
+        """Move the pending rows into the columns with one vectorized parse per field"""
+        if not self.pending:
+            return
+        records = self.pending
+        self.ensure_capacity(len(records))
+        end = self.size + len(records)
+        
+        amounts = pd.to_numeric(pd.Series([record.get('amount') for record in records], dtype=object), errors='coerce')
+        self.amounts[self.size:end] = amounts.fillna(0).to_numpy(np.float64)
+        dates = pd.to_datetime(pd.Series([record.get('entryDate') or record.get('date') for record in records], dtype=object),
+                               errors='coerce')
+        self.dates[self.size:end] = dates.to_numpy('datetime64[ns]')
+        self.items[self.size:end] = [sys.intern(str(record.get('item') or '')) for record in records]
+        for field, codes in self.codes.items():
+            codes[self.size:end] = self.encode([record.get(field) for record in records], self.vocabularies[field])
+        
+        self.size = end
+        self.pending = []
+
+    def to_columns(self) -> TransactionColumns:
+        """Views over the filled part of the buffers"""
+        self.flush()
+        return TransactionColumns(
+            self.items[:self.size], self.amounts[:self.size], self.dates[:self.size],
+            {field: codes[:self.size] for field, codes in self.codes.items()},
+            {field: list(vocabulary) for field, vocabulary in self.vocabularies.items()}
+        )
+
+# Lightweight forecasting engine
+class HoltWintersForecaster:
+    """Additive Holt-Winters with damped trend and weekly seasonality, fitted by a vectorized grid search"""
+    season_length = 7
+    damping = 0.98
+    # 80% interval, matching Prophet's default interval_width
+    interval_z = 1.2816
+
+    def __init__(self):
+        alphas, betas, gammas = np.meshgrid(
+            [0.05, 0.1, 0.2, 0.3, 0.5, 0.7],
+            [0.0, 0.01, 0.05, 0.1],
+            [0.01, 0.05, 0.1, 0.3],
+            indexing='ij'
+        )
+        self.alphas = alphas.ravel()
+        self.betas = betas.ravel()
+        self.gammas = gammas.ravel()
+
+    def fit(self, y: np.ndarray) -> Dict:
+        """Run every smoothing-parameter combination at once and keep the best one-step-ahead fit"""
+        m = self.season_length
+        n_params = len(self.alphas)
+        
+        level = np.full(n_params, y[:m].mean())
+        if len(y) >= 2 * m:
+            trend = np.full(n_params, (y[m:2 * m].mean() - y[:m].mean()) / m)
+        else:
+            trend = np.zeros(n_params)
+        season = np.tile(y[:m] - y[:m].mean(), (n_params, 1))
+        
+        sse = np.zeros(n_params)
+        levels = np.zeros((len(y), n_params))
+        for t in range(len(y)):
+            s_idx = t % m
+            prediction = level + self.damping * trend + season[:, s_idx]
+            error = y[t] - prediction
+            sse += error ** 2
+            
+            new_level = self.alphas * (y[t] - season[:, s_idx]) + (1 - self.alphas) * (level + self.damping * trend)
+            trend = self.betas * (new_level - level) + (1 - self.betas) * self.damping * trend
+            season[:, s_idx] = self.gammas * (y[t] - new_level) + (1 - self.gammas) * season[:, s_idx]
+            level = new_level
+            levels[t] = level
+        
+        best = int(sse.argmin())
+        return {
+            'alpha': self.alphas[best],
+            'beta': self.betas[best],
+            'gamma': self.gammas[best],
+            'level': level[best],
+            'trend': trend[best],
+            'season': season[best],
+            'levels': levels[:, best],
+            'sigma': np.sqrt(sse[best] / max(1, len(y) - 3)),
+            'n': len(y)
+        }
+
+    def forecast(self, df: pd.DataFrame, days_ahead: int = 30, key=None) -> Dict:
+        """Same result shape as the Prophet path of SpendingPredictor.predict_spending"""
+        # Regular daily series; days without spending are zero
+        daily = df.set_index('ds')['y'].asfreq('D', fill_value=0.0)
+        y = daily.values.astype(np.float64)
+        fit = self.fit(y)
+        m = self.season_length
+        
+        horizon = np.arange(1, days_ahead + 1)
+        damped_steps = np.cumsum(self.damping ** horizon)
+        season_idx = (fit['n'] + horizon - 1) % m
+        predictions = fit['level'] + damped_steps * fit['trend'] + fit['season'][season_idx]
+        
+        # Closed-form ETS(A,A,A) forecast variance: sigma^2 * (1 + sum_{j<h} c_j^2)
+        c = fit['alpha'] * (1 + horizon[:-1] * fit['beta']) + fit['gamma'] * (horizon[:-1] % m == 0)
+        variance = fit['sigma'] ** 2 * (1 + np.concatenate([[0.0], np.cumsum(c ** 2)]))
+        half_width = self.interval_z * np.sqrt(variance)
+        
+        total_predicted = predictions.sum()
+        confidence_lower = (predictions - half_width).sum()
+        confidence_upper = (predictions + half_width).sum()
+        
+        # Analyze trend from the smoothed level
+        recent_level = fit['levels'][-10:].mean() + damped_steps[-1] * fit['trend']
+        earlier_level = fit['levels'][:10].mean()
+        trend_direction = 'increasing' if recent_level > earlier_level else 'decreasing'
+        
+        return {
+            'predicted_amount': max(0, float(total_predicted)),
+            'confidence_interval': {
+                'lower': max(0, float(confidence_lower)),
+                'upper': max(0, float(confidence_upper))
+            },
+            'trend': trend_direction,
+            'seasonality': {
+                'weekly': float(fit['season'][season_idx[-7:]].mean()),
+                'yearly': 0
+            },
+            'factors': [
+                f'Historical average: ${df["y"].mean():.2f}/day',
+                f'Trend: {trend_direction}',
+                f'Prediction confidence: {((confidence_upper - confidence_lower) / total_predicted * 100):.1f}% range',
+                'Model: Holt-Winters (weekly seasonality)'
+            ]
+        }
+
+# Time Series Prediction Engine
+class SpendingPredictor:
+    def __init__(self):
+        # (user_id, category, series fingerprint) -> cached fit, most recently used last
+        self.models = OrderedDict()
+        # (user_id, category) -> key of its latest fit, the base for warm starts and stale hits
+        self.latest = {}
+        self.models_lock = threading.Lock()
+        self.refit_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prophet-refit')
+        self.refits_in_flight = set()
+        self.cache_stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'background_refits': 0, 'warm_starts': 0}
+        
+        # Pluggable engines: callables taking (daily_df, days_ahead, cache_key)
+        self.forecasters = {
+            'prophet': self.prophet_forecast,
+            'holt_winters': HoltWintersForecaster().forecast
+        }
+
+    def register_forecaster(self, name: str, forecaster: Callable[[pd.DataFrame, int, Any], Dict]):
+        self.forecasters[name] = forecaster
+
+    def choose_engine(self, df: pd.DataFrame, engine: str = None) -> str:
+        """Resolve 'auto' by history length: short histories skip the Prophet/Stan fit"""
+        engine = engine or FORECAST_ENGINE
+        if engine != 'auto':
+            return engine
+        history_days = (df['ds'].max() - df['ds'].min()).days + 1
+        return 'prophet' if history_days >= FORECAST_PROPHET_MIN_DAYS else 'holt_winters'
+
+    @staticmethod
+    def series_fingerprint(df: pd.DataFrame) -> str:
+        """Stable hash of a daily series"""
+        digest = hashlib.sha1()
+        digest.update(df['ds'].values.astype('datetime64[ns]').astype(np.int64).tobytes())
+        digest.update(df['y'].values.astype(np.float64).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def build_model() -> Prophet:
+        return Prophet(
+            yearly_seasonality=True,
+            weekly_seasonality=True,
+            daily_seasonality=False,
+            changepoint_prior_scale=0.05
+        )
+
+    @staticmethod
+    def warm_start_params(model: Prophet) -> Dict:
+        """Fitted parameters in the form Prophet.fit(init=...) expects"""
+        params = {name: model.params[name][0][0] for name in ['k', 'm', 'sigma_obs']}
+        params.update({name: model.params[name][0] for name in ['delta', 'beta']})
+        return params
+
+    def fit_model(self, df: pd.DataFrame, previous: Prophet = None) -> Prophet:
+        """Fit Prophet, warm-starting from a previous fit when the shapes still line up"""
+        if previous is not None:
+            try:
+                model = self.build_model()
+                model.fit(df, init=self.warm_start_params(previous))
+                self.cache_stats['warm_starts'] += 1
+                return model
+            except Exception as e:
+                print(f"Prophet warm start failed, fitting from scratch: {e}")
+        
+        model = self.build_model()
+        model.fit(df)
+        return model
+
+    def store_model(self, key, model: Prophet, df: pd.DataFrame):
+        with self.models_lock:
+            self.models[key] = {
+                'model': model,
+                'fingerprint': key[-1],
+                'n_rows': len(df),
+                'last_ds': df['ds'].max(),
+                'fitted_at': time.monotonic(),
+                'forecasts': {}
+            }
+            self.models.move_to_end(key)
+            self.latest[key[:-1]] = key
+            while len(self.models) > PROPHET_CACHE_SIZE:
+                evicted, _ = self.models.popitem(last=False)
+                if self.latest.get(evicted[:-1]) == evicted:
+                    del self.latest[evicted[:-1]]
+
+    def background_refit(self, key, df: pd.DataFrame, previous: Prophet):
+        try:
+            self.store_model(key, self.fit_model(df, previous), df)
+            self.cache_stats['background_refits'] += 1
+        except Exception as e:
+            print(f"Background Prophet refit error: {e}")
+        finally:
+            with self.models_lock:
+                self.refits_in_flight.discard(key)
+
+    def get_model(self, key, df: pd.DataFrame):
+        """Return (cache entry, fresh); fits inline only when nothing usable is cached"""
+        key = (*key, self.series_fingerprint(df))
+        
+        with self.models_lock:
+            entry = self.models.get(key)
+            if entry is not None and time.monotonic() - entry['fitted_at'] > PROPHET_CACHE_TTL:
+                del self.models[key]
+                entry = None
+            if entry is not None:
+                self.models.move_to_end(key)
+                self.cache_stats['hits'] += 1
+                return entry, True
+            
+            # Otherwise start from the latest fit for this user and category, if it has not expired
+            latest_key = self.latest.get(key[:-1])
+            entry = self.models.get(latest_key) if latest_key is not None else None
+            if entry is not None and time.monotonic() - entry['fitted_at'] > PROPHET_CACHE_TTL:
+                entry = None
+            
+            if entry is not None:
+                # Same history plus a few new days: serve the old fit now, refit in the background
+                new_days = (df['ds'].max() - entry['last_ds']).days
+                extends_cached = (
+                    len(df) > entry['n_rows'] and
+                    0 < new_days <= PROPHET_WARM_START_MAX_NEW_DAYS and
+                    self.series_fingerprint(df.iloc[:entry['n_rows']]) == entry['fingerprint']
+                )
+                if extends_cached:
+                    self.cache_stats['stale_hits'] += 1
+                    if key not in self.refits_in_flight:
+                        self.refits_in_flight.add(key)
+                        self.refit_executor.submit(self.background_refit, key, df.copy(), entry['model'])
+                    return entry, False
+            
+            self.cache_stats['misses'] += 1
+            previous = entry['model'] if entry is not None else None
+        
+        self.store_model(key, self.fit_model(df, previous), df)
+        with self.models_lock:
+            return self.models[key], True
+
+    def get_cache_stats(self) -> Dict:
+        with self.models_lock:
+            return dict(self.cache_stats, cached_models=len(self.models), refits_in_flight=len(self.refits_in_flight))
+
+    def prepare_time_series_data(self, transactions: TransactionColumns, category: str = None) -> pd.DataFrame:
+        """Prepare transaction data for time series analysis"""
+        if not isinstance(transactions, TransactionColumns):
+            transactions = TransactionColumns.from_records(transactions)
+        
+        # Aggregate by day
+        return transactions.daily_totals(category)
+
+    def predict_spending(self, transactions: TransactionColumns, category: str = None, days_ahead: int = 30,
+                         user_id: str = "default", engine: str = None) -> Dict:
+        """Predict future spending with the requested (or automatically chosen) engine"""
+        try:
+            df = self.prepare_time_series_data(transactions, category)
+            return self.predict_daily_spending(df, category, days_ahead, user_id, engine)
+            
+        except Exception as e:
+            print(f"Prediction error: {e}")
+            return {
+                'predicted_amount': 0,
+                'confidence_interval': {'lower': 0, 'upper': 0},
+                'trend': 'error',
+                'factors': [f'Prediction failed: {str(e)}']
+            }
+
+    def predict_daily_spending(self, df: pd.DataFrame, category: str = None, days_ahead: int = 30,
+                               user_id: str = "default", engine: str = None) -> Dict:
+        """Predict from an already aggregated daily series (columns ds, y)"""
+        try:
+            if len(df) < 10:  # Need sufficient data
+                return {
+                    'predicted_amount': 0,
+                    'confidence_interval': {'lower': 0, 'upper': 0},
+                    'trend': 'insufficient_data',
+                    'factors': ['Need more historical data for accurate predictions']
+                }
+            
+            forecaster = self.forecasters[self.choose_engine(df, engine)]
+            return forecaster(df, days_ahead, (user_id, category))
+            
+        except Exception as e:
+            print(f"Prediction error: {e}")
+            return {
+                'predicted_amount': 0,
+                'confidence_interval': {'lower': 0, 'upper': 0},
+                'trend': 'error',
+                'factors': [f'Prediction failed: {str(e)}']
+            }
+
+    def prophet_forecast(self, df: pd.DataFrame, days_ahead: int = 30, key=None) -> Dict:
+        """Forecast with a cached Prophet fit"""
+        # Reuse a cached Prophet fit for this user and category
+        entry, fresh = self.get_model(key, df)
+        if fresh and days_ahead in entry['forecasts']:
+            return entry['forecasts'][days_ahead]
+        
+        # Forecast over the current history and the days after its last date
+        future_ds = pd.date_range(df['ds'].max() + timedelta(days=1), periods=days_ahead, freq='D')
+        future = pd.DataFrame({'ds': pd.concat([df['ds'], pd.Series(future_ds)], ignore_index=True)})
+        forecast = entry['model'].predict(future)
+        
+        # Get prediction for the period
+        future_predictions = forecast.tail(days_ahead)
+        total_predicted = future_predictions['yhat'].sum()
+        confidence_lower = future_predictions['yhat_lower'].sum()
+        confidence_upper = future_predictions['yhat_upper'].sum()
+        
+        # Analyze trend
+        recent_trend = forecast['trend'].tail(10).mean()
+        earlier_trend = forecast['trend'].head(10).mean()
+        trend_direction = 'increasing' if recent_trend > earlier_trend else 'decreasing'
+        
+        result = {
+            'predicted_amount': max(0, total_predicted),
+            'confidence_interval': {
+                'lower': max(0, confidence_lower),
+                'upper': max(0, confidence_upper)
+            },
+            'trend': trend_direction,
+            'seasonality': {
+                'weekly': forecast['weekly'].tail(7).mean(),
+                'yearly': forecast['yearly'].tail(1).iloc[0] if 'yearly' in forecast.columns else 0
+            },
+            'factors': [
+                f'Historical average: ${df["y"].mean():.2f}/day',
+                f'Trend: {trend_direction}',
+                f'Prediction confidence: {((confidence_upper - confidence_lower) / total_predicted * 100):.1f}% range'
+            ]
+        }
+        
+        if fresh:
+            entry['forecasts'][days_ahead] = result
+        return result
+
+def transactions_frame(transactions) -> pd.DataFrame:
+    """DataFrame with a parsed date column from columns or a payload list"""
+    if not isinstance(transactions, TransactionColumns):
+        transactions = TransactionColumns.from_records(transactions)
+    return transactions.to_frame()
+
+# Advanced Insights Engine
+class InsightsEngine:
+    def __init__(self):
+        self.predictor = SpendingPredictor()
+        
+    def generate_advanced_insights(self, transactions: TransactionColumns, budgets: Dict = None, user_id: str = "default",
+                                   aggregates: Dict = None) -> List[Dict]:
+        """Generate advanced AI-powered insights (from precomputed rollups when aggregates is given)"""
+        insights = []
+        
+        if (aggregates['count'] == 0) if aggregates is not None else len(transactions) == 0:
+            return [{
+                'type': 'info',
+                'priority': 'low',
+                'title': 'Getting Started',
+                'message': 'Add transactions to unlock AI-powered insights',
+                'confidence': 1.0
+            }]
+        
+        # Convert to DataFrame and compute every grouped statistic once
+        df = transactions_frame(transactions)
+        if aggregates is None:
+            aggregates = self.compute_aggregates(df)
+        
+        # Spending pattern analysis
+        insights.extend(self.analyze_spending_patterns(df, aggregates))
+        
+        # Anomaly detection
+        insights.extend(self.detect_spending_anomalies(df, aggregates))
+        
+        # Seasonal analysis
+        insights.extend(self.analyze_seasonality(df, aggregates))
+        
+        # Budget optimization
+        if budgets:
+            insights.extend(self.optimize_budgets(df, budgets, aggregates))
+        
+        # Predictive insights
+        insights.extend(self.generate_predictive_insights(transactions, user_id, aggregates))
+        
+        # Sort by priority and confidence
+        priority_order = {'high': 3, 'medium': 2, 'low': 1}
+        insights.sort(key=lambda x: (priority_order.get(x['priority'], 0), x.get('confidence', 0)), reverse=True)
+        
+        return insights[:10]  # Return top 10 insights
+
+    def compute_aggregates(self, df: pd.DataFrame) -> Dict:
+        """One vectorized pass over the frame producing the statistics every analyzer reads"""
+        amounts = df['amount'].to_numpy(dtype=np.float64)
+        dates = df['date']
+        
+        # Weekday and calendar-month means via bincount over integer codes (rows without a date skipped)
+        dated = dates.notna().to_numpy()
+        dated_amounts = amounts[dated]
+        weekday = dates[dated].dt.dayofweek.to_numpy()
+        weekday_counts = np.bincount(weekday, minlength=7)
+        weekday_sums = np.bincount(weekday, weights=dated_amounts, minlength=7)
+        present_days = np.nonzero(weekday_counts)[0]
+        weekday_mean = pd.Series(
+            weekday_sums[present_days] / weekday_counts[present_days],
+            index=[WEEKDAY_NAMES[day] for day in present_days]
+        )
+        
+        month = dates[dated].dt.month.to_numpy()
+        month_counts = np.bincount(month, minlength=13)
+        month_sums = np.bincount(month, weights=dated_amounts, minlength=13)
+        present_months = np.nonzero(month_counts)[0]
+        month_mean = pd.Series(month_sums[present_months] / month_counts[present_months], index=present_months)
+        
+        # Per-category sum, mean and sample std from a single factorization (NaN categories dropped)
+        codes, categories = pd.factorize(df['category']) if 'category' in df.columns else (np.full(len(df), -1), pd.Index([]))
+        valid = codes >= 0
+        category_counts = np.bincount(codes[valid], minlength=len(categories))
+        category_sums = np.bincount(codes[valid], weights=amounts[valid], minlength=len(categories))
+        category_means = category_sums / np.maximum(category_counts, 1)
+        squared_deviations = np.bincount(
+            codes[valid], weights=(amounts[valid] - category_means[codes[valid]]) ** 2, minlength=len(categories)
+        )
+        with np.errstate(invalid='ignore', divide='ignore'):
+            category_stds = np.sqrt(squared_deviations / (category_counts - 1))
+        category_stats = pd.DataFrame(
+            {'sum': category_sums, 'mean': category_means, 'std': category_stds, 'count': category_counts},
+            index=categories
+        )
+        
+        # Daily totals, shared with the forecaster
+        daily = pd.Series(dated_amounts, index=dates[dated].dt.normalize()).groupby(level=0).sum()
+        daily_spending = pd.DataFrame({'ds': daily.index, 'y': daily.values})
+        
+        return {
+            'weekday_mean': weekday_mean,
+            'month_mean': month_mean,
+            'category_stats': category_stats,
+            'daily_spending': daily_spending,
+            'amount_quantiles': np.quantile(amounts, [0.25, 0.75]) if len(amounts) else np.zeros(2),
+            'count': len(amounts)
+        }
+
+    def analyze_spending_patterns(self, df: pd.DataFrame, aggregates: Dict = None) -> List[Dict]:
+        """Analyze spending patterns using clustering"""
+        insights = []
+        aggregates = aggregates or self.compute_aggregates(df)
+        
+        try:
+            # Analyze spending by day of week
+            daily_spending = aggregates['weekday_mean']
+            
+            highest_day = daily_spending.idxmax()
+            highest_amount = daily_spending.max()
+            
+            insights.append({
+                'type': 'info',
+                'priority': 'medium',
+                'title': 'Spending Pattern',
+                'message': f'You spend most on {highest_day}s (avg: ${highest_amount:.2f})',
+                'confidence': 0.8,
+                'data': daily_spending.to_dict()
+            })
+            
+            # Analyze category distribution
+            category_spending = aggregates['category_stats']['sum'].sort_values(ascending=False)
+            if len(category_spending) > 1:
+                top_category = category_spending.index[0]
+                top_amount = category_spending.iloc[0]
+                total_spending = category_spending.sum()
+                percentage = (top_amount / total_spending) * 100
+                
+                if percentage > 50:
+                    insights.append({
+                        'type': 'warning',
+                        'priority': 'high',
+                        'title': 'Spending Concentration',
+                        'message': f'{top_category} dominates your spending ({percentage:.1f}% of total)',
+                        'confidence': 0.9,
+                        'recommendation': 'Consider diversifying your expenses or reviewing this category'
+                    })
+            
+        except Exception as e:
+            print(f"Pattern analysis error: {e}")
+        
+        return insights
+
+    def detect_spending_anomalies(self, df: pd.DataFrame, aggregates: Dict = None) -> List[Dict]:
+        """Detect spending anomalies using machine learning"""
+        insights = []
+        
+        try:
+            if len(df) < 10:
+                return insights
+            
+            if aggregates is not None and aggregates['amount_quantiles'] is not None:
+                q25, q75 = aggregates['amount_quantiles']
+            else:
+                q25, q75 = df['amount'].quantile([0.25, 0.75])
+            
+            # Use Isolation Forest for anomaly detection
+            features = df[['amount']].values
+            iso_forest = IsolationForest(contamination=0.1, random_state=42)
+            anomalies = iso_forest.fit_predict(features)
+            
+            anomaly_transactions = df[anomalies == -1]
+            
+            if len(anomaly_transactions) > 0:
+                for _, transaction in anomaly_transactions.head(3).iterrows():  # Top 3 anomalies
+                    insights.append({
+                        'type': 'warning',
+                        'priority': 'medium',
+                        'title': 'Unusual Spending Detected',
+                        'message': f'${transaction["amount"]:.2f} for {transaction["item"]} is unusual for you',
+                        'confidence': 0.7,
+                        'data': {
+                            # Missing categoricals/dates come back as NaN/NaT, which JSON responses reject
+                            'transaction': {field: None if pd.isna(value) else value
+                                            for field, value in transaction.to_dict().items()},
+                            'typical_range': f'${q25:.2f} - ${q75:.2f}'
+                        }
+                    })
+                    
+        except Exception as e:
+            print(f"Anomaly detection error: {e}")
+        
+        return insights
+
+    def analyze_seasonality(self, df: pd.DataFrame, aggregates: Dict = None) -> List[Dict]:
+        """Analyze seasonal spending patterns"""
+        insights = []
+        
+        try:
+            aggregates = aggregates or self.compute_aggregates(df)
+            if aggregates['count'] < 30:  # Need at least a month of data
+                return insights
+            
+            # Monthly spending analysis
+            monthly_spending = aggregates['month_mean']
+            
+            if len(monthly_spending) > 3:
+                highest_month = monthly_spending.idxmax()
+                lowest_month = monthly_spending.idxmin()
+                
+                month_names = ['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                              'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+                
+                insights.append({
+                    'type': 'info',
+                    'priority': 'medium',
+                    'title': 'Seasonal Pattern',
+                    'message': f'You typically spend more in {month_names[highest_month]} and less in {month_names[lowest_month]}',
+                    'confidence': 0.7,
+                    'data': monthly_spending.to_dict()
+                })
+                
+        except Exception as e:
+            print(f"Seasonality analysis error: {e}")
+        
+        return insights
+
+    def optimize_budgets(self, df: pd.DataFrame, budgets: Dict, aggregates: Dict = None) -> List[Dict]:
+        """Optimize budgets using historical data"""
+        insights = []
+        
+        try:
+            expense_budgets = budgets.get('expense', {})
+            category_stats = (aggregates or self.compute_aggregates(df))['category_stats']
+            
+            for category, budget in expense_budgets.items():
+                if category not in category_stats.index:
+                    continue
+                stats = category_stats.loc[category]
+                
+                if stats['count'] > 5:  # Need sufficient data
+                    avg_spending = stats['mean']
+                    std_spending = stats['std']
+                    
+                    # Recommend budget adjustment
+                    recommended_budget = avg_spending + (2 * std_spending)  # 95% confidence interval
+                    
+                    if recommended_budget > budget * 1.2:
+                        insights.append({
+                            'type': 'suggestion',
+                            'priority': 'medium',
+                            'title': f'{category} Budget Optimization',
+                            'message': f'Consider increasing budget from ${budget} to ${recommended_budget:.2f}',
+                            'confidence': 0.8,
+                            'recommendation': f'Based on spending pattern: avg ${avg_spending:.2f} ± ${std_spending:.2f}'
+                        })
+                    elif recommended_budget < budget * 0.8:
+                        insights.append({
+                            'type': 'success',
+                            'priority': 'low',
+                            'title': f'{category} Budget Opportunity',
+                            'message': f'You could reduce budget from ${budget} to ${recommended_budget:.2f}',
+                            'confidence': 0.7,
+                            'recommendation': 'Free up budget for other categories'
+                        })
+                        
+        except Exception as e:
+            print(f"Budget optimization error: {e}")
+        
+        return insights
+
+    def generate_predictive_insights(self, transactions: TransactionColumns, user_id: str = "default",
+                                     aggregates: Dict = None) -> List[Dict]:
+        """Generate predictive insights"""
+        insights = []
+        
+        try:
+            # Overall spending prediction, reusing the daily totals when already computed
+            if aggregates is not None:
+                prediction = self.predictor.predict_daily_spending(aggregates['daily_spending'], days_ahead=30, user_id=user_id)
+            else:
+                prediction = self.predictor.predict_spending(transactions, days_ahead=30, user_id=user_id)
+            
+            if prediction['predicted_amount'] > 0:
+                insights.append({
+                    'type': 'prediction',
+                    'priority': 'high',
+                    'title': 'Next 30-Day Prediction',
+                    'message': f'Predicted spending: ${prediction["predicted_amount"]:.2f} (trend: {prediction["trend"]})',
+                    'confidence': 0.7,
+                    'data': prediction
+                })
+                
+        except Exception as e:
+            print(f"Predictive insights error: {e}")
+        
+        return insights
+
+# Receipt image preprocessing and Tesseract OCR
+class ReceiptOCR:
+    def __init__(self):
+        # Multiple OCR configurations for different text types, most likely winner first
+        self.ocr_configs = [
+            r'--oem 3 --psm 6',  # Uniform block of text
+            r'--oem 3 --psm 8',  # Single word
+            r'--oem 3 --psm 7',  # Single text line
+            r'--oem 3 --psm 11', # Sparse text
+        ]
+        self.ocr_executor = None
+        self.ocr_executor_pid = None
+        self.ocr_executor_lock = threading.Lock()
+        
+        # CLAHE objects keep internal buffers, so each thread reuses its own
+        self.local = threading.local()
+
+    def get_clahe(self):
+        clahe = getattr(self.local, 'clahe', None)
+        if clahe is None:
+            clahe = self.local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        return clahe
+
+    def get_ocr_executor(self) -> ThreadPoolExecutor:
+        """Per-process thread pool, created lazily so forked compute workers get their own"""
+        with self.ocr_executor_lock:
+            if self.ocr_executor is None or self.ocr_executor_pid != os.getpid():
+                # Concurrent Tesseract processes should not each spin up a full OpenMP team
+                os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+                self.ocr_executor = ThreadPoolExecutor(max_workers=max(1, OCR_CONFIG_WORKERS), thread_name_prefix='ocr')
+                self.ocr_executor_pid = os.getpid()
+            return self.ocr_executor
+
+    def shutdown(self):
+        if self.ocr_executor is not None and self.ocr_executor_pid == os.getpid():
+            self.ocr_executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def text_from_data(data: Dict) -> str:
+        """Rebuild image_to_string-style text from image_to_data words, saving a second OCR pass"""
+        lines = []
+        current_line = None
+        current_paragraph = None
+        for index, word in enumerate(data['text']):
+            if not str(word).strip():
+                continue
+            paragraph = (data['block_num'][index], data['par_num'][index])
+            line = paragraph + (data['line_num'][index],)
+            if line != current_line:
+                if current_paragraph is not None and paragraph != current_paragraph:
+                    lines.append('')  # Blank line between paragraphs, as image_to_string does
+                lines.append(str(word))
+                current_line, current_paragraph = line, paragraph
+            else:
+                lines[-1] += ' ' + str(word)
+        return '\n'.join(lines)
+
+    def run_ocr_config(self, processed_image, config: str):
+        """One Tesseract pass; returns (text, mean word confidence 0-100)"""
+        data = pytesseract.image_to_data(processed_image, config=config, output_type=pytesseract.Output.DICT)
+        confidences = [float(conf) for conf in data['conf'] if float(conf) > 0]
+        if not confidences:
+            return "", 0.0
+        return self.text_from_data(data), sum(confidences) / len(confidences)
+
+    @staticmethod
+    def order_corners(points: np.ndarray) -> np.ndarray:
+        """Corners as top-left, top-right, bottom-right, bottom-left"""
+        sums = points.sum(axis=1)
+        diffs = np.diff(points, axis=1).ravel()
+        return np.array([points[sums.argmin()], points[diffs.argmin()], points[sums.argmax()], points[diffs.argmax()]],
+                        dtype=np.float32)
+
+    def detect_receipt(self, gray, min_area_fraction: float = 0.2) -> Optional[np.ndarray]:
+        """Corners of the largest four-sided outline (the receipt) in full-image coordinates, or None"""
+        # Edges are found on a small copy; only the corner coordinates are scaled back
+        scale = min(1.0, 500 / max(gray.shape))
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+        edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+        edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+        
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = min_area_fraction * small.shape[0] * small.shape[1]
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+            if cv2.contourArea(contour) < min_area:
+                break
+            outline = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+            if len(outline) == 4 and cv2.isContourConvex(outline):
+                return self.order_corners(outline.reshape(4, 2).astype(np.float32) / scale)
+        return None
+
+    def warp_receipt(self, gray, corners: np.ndarray):
+        """Perspective-correct the receipt straight to the working size, so no separate resize is needed"""
+        top_left, top_right, bottom_right, bottom_left = corners
+        width = max(np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left))
+        height = max(np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right))
+        width, height = self.working_size(int(width), int(height))
+        
+        target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+        matrix = cv2.getPerspectiveTransform(corners, target)
+        return cv2.warpPerspective(gray, matrix, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    @staticmethod
+    def crop_text_block(binary, gray, region: str = 'full', margin: int = 16, min_ink: float = 0.01):
+        """Crop binary to the rows/columns of gray that carry text; 'bottom' keeps only the lower part"""
+        # Text is found with a global Otsu split of a quarter-size copy, which ignores the
+        # speckle adaptive thresholding leaves on noisy paper
+        scale = 4
+        small = cv2.resize(gray, (max(1, gray.shape[1] // scale), max(1, gray.shape[0] // scale)), interpolation=cv2.INTER_AREA)
+        _, ink = cv2.threshold(small, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        
+        # Ignore a thin frame where the receipt edge or warp border shows up as solid lines
+        border_y, border_x = max(1, ink.shape[0] // 50), max(1, ink.shape[1] // 50)
+        inner = ink[border_y:-border_y, border_x:-border_x]
+        rows = np.flatnonzero(inner.sum(axis=1) > min_ink * inner.shape[1]) + border_y
+        columns = np.flatnonzero(inner.sum(axis=0) > min_ink * inner.shape[0]) + border_x
+        if len(rows) == 0 or len(columns) == 0:
+            return binary
+        
+        top, bottom = max(0, rows[0] * scale - margin), min(binary.shape[0], (rows[-1] + 1) * scale + margin)
+        left, right = max(0, columns[0] * scale - margin), min(binary.shape[1], (columns[-1] + 1) * scale + margin)
+        if region == 'bottom':
+            top = max(top, bottom - int((bottom - top) * OCR_BOTTOM_FRACTION))
+        return binary[top:bottom, left:right]
+
+    @staticmethod
+    def working_size(width: int, height: int):
+        """Size to filter at: large images are brought down to OCR_MAX_WIDTH, smaller ones kept as they are"""
+        if width <= OCR_MAX_WIDTH:
+            return width, height
+        scale = OCR_MAX_WIDTH / width
+        return int(width * scale), int(height * scale)
+
+    def denoise(self, gray, method: str = None):
+        method = method or OCR_DENOISE
+        if method == 'median':
+            return cv2.medianBlur(gray, 3)
+        if method == 'gaussian':
+            return cv2.GaussianBlur(gray, (3, 3), 0)
+        if method == 'bilateral':
+            return cv2.bilateralFilter(gray, 9, 75, 75)
+        return gray
+
+    def advanced_preprocess(self, image_array, timings: Dict = None, denoise: str = None,
+                            detect: bool = None, region: str = None):
+        """Advanced image preprocessing for better OCR; per-stage milliseconds go into timings when given"""
+        try:
+            stage_start = time.perf_counter()
+            
+            def mark(stage):
+                nonlocal stage_start
+                if timings is not None:
+                    now = time.perf_counter()
+                    timings[stage] = timings.get(stage, 0.0) + (now - stage_start) * 1000
+                    stage_start = now
+            
+            # Convert to grayscale
+            if len(image_array.shape) == 3:
+                gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
+            else:
+                gray = image_array
+            mark('grayscale')
+            
+            # Find the receipt in the photo; the perspective warp also brings it to the working size
+            corners = self.detect_receipt(gray) if (OCR_DETECT_RECEIPT if detect is None else detect) else None
+            mark('detect')
+            
+            if corners is not None:
+                gray = self.warp_receipt(gray, corners)
+            else:
+                # Shrink phone photos before any filtering; small scans are enlarged only after thresholding
+                height, width = gray.shape
+                new_width, new_height = self.working_size(width, height)
+                if new_width != width:
+                    gray = cv2.resize(gray, (new_width, new_height), interpolation=cv2.INTER_AREA)
+            mark('resize')
+            
+            # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
+            enhanced = self.get_clahe().apply(gray)
+            mark('clahe')
+            
+            # Noise reduction
+            denoised = self.denoise(enhanced, denoise)
+            mark('denoise')
+            
+            # Adaptive thresholding
+            binary = cv2.adaptiveThreshold(
+                denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                cv2.THRESH_BINARY, 11, 2
+            )
+            mark('threshold')
+            
+            # Hand Tesseract only the text block (or its bottom part)
+            region = region or OCR_REGION
+            scale = OCR_TARGET_WIDTH / binary.shape[1]
+            if region in ('full', 'bottom'):
+                binary = self.crop_text_block(binary, denoised, region)
+            mark('text_crop')
+            
+            # Scale up for better OCR recognition; filtering at the original size is much cheaper
+            if scale > 1:
+                height, width = binary.shape
+                binary = cv2.resize(binary, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_CUBIC)
+            mark('resize')
+            
+            return binary
+            
+        except Exception as e:
+            print(f"Advanced preprocessing error: {e}")
+            return image_array
+
+    def extract_with_confidence(self, image_array):
+        """Extract text with confidence scores"""
+        try:
+            processed_image = self.advanced_preprocess(image_array)
+            
+            best_result = ""
+            best_confidence = 0
+            
+            # Every config runs concurrently; the first to clear the threshold wins outright
+            futures = [self.get_ocr_executor().submit(self.run_ocr_config, processed_image, config)
+                       for config in self.ocr_configs]
+            for future in as_completed(futures):
+                try:
+                    text, avg_confidence = future.result()
+                except Exception as e:
+                    print(f"OCR config error: {e}")
+                    continue
+                
+                if avg_confidence > best_confidence:
+                    best_confidence = avg_confidence
+                    best_result = text
+                if best_confidence >= OCR_EARLY_EXIT_CONFIDENCE:
+                    break
+            
+            for future in futures:
+                future.cancel()  # Configs still queued are skipped after an early exit
+            
+            return best_result.strip(), best_confidence / 100.0
+            
+        except Exception as e:
+            print(f"OCR extraction error: {e}")
+            return "", 0.0
+
+# Per-process state: the engine (and its Prophet cache) and the OCR processor, created on first use.
+# Each is tagged with the pid that built it, so forked workers build their own
+insights_engine = None
+insights_engine_pid = None
+receipt_ocr = None
+receipt_ocr_pid = None
+state_lock = threading.Lock()
+
+def get_insights_engine() -> InsightsEngine:
+    global insights_engine, insights_engine_pid
+    with state_lock:
+        if insights_engine is None or insights_engine_pid != os.getpid():
+            insights_engine = InsightsEngine()
+            insights_engine_pid = os.getpid()
+        return insights_engine
+
+def get_receipt_ocr() -> ReceiptOCR:
+    global receipt_ocr, receipt_ocr_pid
+    with state_lock:
+        if receipt_ocr is None or receipt_ocr_pid != os.getpid():
+            receipt_ocr = ReceiptOCR()
+            receipt_ocr_pid = os.getpid()
+        return receipt_ocr
+
+def worker_stats() -> Dict:
+    """Cache statistics of this process, reported back with every job result"""
+    return {'pid': os.getpid(), 'prophet_cache': get_insights_engine().predictor.get_cache_stats()}
+
+def run_job(fn: Callable, *args):
+    """Pool entry point: (fn(*args), worker_stats())"""
+    return fn(*args), worker_stats()
+
+def predict_spending_job(transactions: TransactionColumns, category: str, days_ahead: int, user_id: str, engine: str) -> Dict:
+    return get_insights_engine().predictor.predict_spending(transactions, category, days_ahead, user_id, engine)
+
+def predict_daily_spending_job(daily: pd.DataFrame, category: str, days_ahead: int, user_id: str, engine: str) -> Dict:
+    return get_insights_engine().predictor.predict_daily_spending(daily, category, days_ahead, user_id, engine)
+
+def generate_insights_job(transactions: TransactionColumns, budgets: Dict, user_id: str, aggregates: Dict = None) -> List[Dict]:
+    return get_insights_engine().generate_advanced_insights(transactions, budgets, user_id, aggregates)
+
+def detect_anomalies_job(transactions: TransactionColumns) -> List[Dict]:
+    return get_insights_engine().detect_spending_anomalies(transactions_frame(transactions))
+
+def receipt_ocr_job(image_data: bytes):
+    """Decode and OCR one receipt image; None when the bytes are not an image"""
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return get_receipt_ocr().extract_with_confidence(image)
+
+def shutdown():
+    """Stop this process's background executors"""
+    if insights_engine is not None and insights_engine_pid == os.getpid():
+        insights_engine.predictor.refit_executor.shutdown(wait=False)
+    if receipt_ocr is not None:
+        receipt_ocr.shutdown()
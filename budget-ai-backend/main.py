@@ -1,8 +1,14 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from collections import OrderedDict
+import asyncio
 import os
 import re
 import uvicorn
@@ -12,36 +18,105 @@ from PIL import Image
 from datetime import datetime, timedelta
 import base64
 import io
-import pytesseract
 import json
-import platform
+import hashlib
+import importlib.util
+import sqlite3
+import time
+import threading
+import csv
+import sys
+import uuid
+import zlib
+from array import array
 
 # Advanced ML imports
 from transformers import pipeline, AutoTokenizer, AutoModel
 import torch
 import pandas as pd
-from sklearn.ensemble import IsolationForest
 from sklearn.cluster import DBSCAN
 from sklearn.preprocessing import StandardScaler
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import pickle
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from scipy import sparse
 import joblib
-from prophet import Prophet
 import warnings
 warnings.filterwarnings('ignore')
 
-# Auto-detect Tesseract installation
-if platform.system() == "Windows":
-    possible_paths = [
-        r"C:\Program Files\Tesseract-OCR\tesseract.exe",
-        r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
-        r"C:\Users\{}\AppData\Local\Programs\Tesseract-OCR\tesseract.exe".format(os.getenv('USERNAME'))
-    ]
-    for path in possible_paths:
-        if os.path.exists(path):
-            pytesseract.pytesseract.tesseract_cmd = path
-            break
+# CPU-bound work and the classes it shares with the API, importable on its own by compute pool workers
+from compute_jobs import (
+    WEEKDAY_NAMES, TransactionColumns, TransactionBuffer, ReceiptOCR, get_insights_engine, run_job, worker_stats,
+    predict_spending_job, predict_daily_spending_job, generate_insights_job, detect_anomalies_job, receipt_ocr_job,
+    shutdown as shutdown_compute_jobs
+)
+
+# Number of texts per BERT forward pass in batched inference
+BERT_BATCH_SIZE = int(os.getenv('BERT_BATCH_SIZE', '32'))
+
+# Micro-batching window for concurrent embedding requests
+EMBED_BATCH_WINDOW_MS = float(os.getenv('EMBED_BATCH_WINDOW_MS', '5'))
+EMBED_MAX_BATCH = int(os.getenv('EMBED_MAX_BATCH', str(BERT_BATCH_SIZE)))
+
+# Embedding cache limits and optional on-disk snapshot
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '10000'))
+EMBEDDING_CACHE_MAX_MB = float(os.getenv('EMBEDDING_CACHE_MAX_MB', '64'))
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', 'embedding_cache.npy')
+EMBEDDING_CACHE_PERSIST = os.getenv('EMBEDDING_CACHE_PERSIST', '1') == '1'
+
+# Most recent learned transactions kept in the in-memory TF-IDF window
+LEARNING_HISTORY_LIMIT = int(os.getenv('LEARNING_HISTORY_LIMIT', '10000'))
+
+# SQLite store for learned transactions; legacy JSON learning files are imported once
+LEARNING_DB_PATH = os.getenv('LEARNING_DB_PATH', 'learning_data.db')
+LEGACY_SNAPSHOT_PATH = 'learning_data.json'
+LEGACY_LOG_PATH = 'learning_data.jsonl'
+
+# Cached per-category anomaly models are refit after this much new data
+ANOMALY_REFIT_MIN = int(os.getenv('ANOMALY_REFIT_MIN', '5'))
+ANOMALY_REFIT_FRACTION = float(os.getenv('ANOMALY_REFIT_FRACTION', '0.1'))
+
+# Approximate nearest-neighbour index over learned transaction embeddings
+ANN_INDEX_DIR = os.getenv('ANN_INDEX_DIR', 'ann_index')
+ANN_MIN_ROWS = int(os.getenv('ANN_MIN_ROWS', '2000'))
+ANN_NPROBE = int(os.getenv('ANN_NPROBE', '4'))
+ANN_CANDIDATES = int(os.getenv('ANN_CANDIDATES', '20'))
+
+# Per-user learning state kept in memory; least recently used users are evicted
+MAX_ACTIVE_USERS = int(os.getenv('MAX_ACTIVE_USERS', '256'))
+TEXT_INDEX_FEATURES = int(os.getenv('TEXT_INDEX_FEATURES', str(2 ** 16)))
+
+# Optional merchant dictionary (CSV rows of name,category or a JSON object) used by categorization and receipts
+MERCHANT_DICTIONARY_PATH = os.getenv('MERCHANT_DICTIONARY_PATH', '')
+
+# Process pool for CPU-bound fits and OCR; 0 workers runs jobs in the threadpool instead
+COMPUTE_POOL_WORKERS = int(os.getenv('COMPUTE_POOL_WORKERS', str(os.cpu_count() or 1)))
+COMPUTE_POOL_MAX_QUEUE = int(os.getenv('COMPUTE_POOL_MAX_QUEUE', str(4 * (os.cpu_count() or 1))))
+COMPUTE_POOL_TIMEOUT = float(os.getenv('COMPUTE_POOL_TIMEOUT', '60'))
+# Workers start from a clean process rather than a fork of the API, which holds BERT and live threads
+COMPUTE_POOL_START_METHOD = os.getenv('COMPUTE_POOL_START_METHOD', 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+# Multi-receipt uploads: files per request, receipts OCRed at once, and how long finished jobs are kept
+RECEIPT_BATCH_MAX_FILES = int(os.getenv('RECEIPT_BATCH_MAX_FILES', '100'))
+RECEIPT_BATCH_CONCURRENCY = int(os.getenv('RECEIPT_BATCH_CONCURRENCY', str(max(1, min(COMPUTE_POOL_WORKERS, COMPUTE_POOL_MAX_QUEUE)))))
+RECEIPT_JOB_MAX = int(os.getenv('RECEIPT_JOB_MAX', '100'))
+RECEIPT_JOB_TTL = float(os.getenv('RECEIPT_JOB_TTL', '3600'))
+
+# Parsed receipts reused for repeat uploads of the exact same image bytes; RECEIPT_CACHE_SIZE=0 disables it.
+# RECEIPT_CACHE_MAX_DISTANCE > 0 also reuses results for images whose 256-bit perceptual hash is that close.
+# Receipts printed from one store template can hash within a few bits of each other, so it is off by default
+RECEIPT_CACHE_SIZE = int(os.getenv('RECEIPT_CACHE_SIZE', '512'))
+RECEIPT_CACHE_TTL = float(os.getenv('RECEIPT_CACHE_TTL', '3600'))
+RECEIPT_CACHE_MAX_DISTANCE = int(os.getenv('RECEIPT_CACHE_MAX_DISTANCE', '0'))
+
+# Whole-history insight/forecast requests for a stored user read the materialized rollups
+ROLLUPS_ENABLED = os.getenv('ROLLUPS_ENABLED', 'true').lower() == 'true'
+ROLLUP_RECENT_ROWS = int(os.getenv('ROLLUP_RECENT_ROWS', '1000'))
+
+# /api/advanced-insights responses cached by a hash of their inputs
+INSIGHT_CACHE_SIZE = int(os.getenv('INSIGHT_CACHE_SIZE', '256'))
+
+# Streaming NDJSON/CSV uploads are parsed in chunks of STREAM_CHUNK_ROWS rows (compute_jobs.py), up to this many rows
+STREAM_MAX_ROWS = int(os.getenv('STREAM_MAX_ROWS', '5000000'))
 
 app = FastAPI(title="Enhanced AI Budget Tracker", version="2.0.0")
 
@@ -62,6 +137,9 @@ class TransactionInput(BaseModel):
     entryDate: str
     user_id: Optional[str] = "default"
 
+class BulkTransactionInput(BaseModel):
+    transactions: List[TransactionInput]
+
 class AdvancedInsight(BaseModel):
     type: str
     priority: str
@@ -84,9 +162,1187 @@ class AnomalyDetection(BaseModel):
     similar_transactions: List[Dict[str, Any]]
     explanation: str
 
+# Bounded LRU cache of text embeddings
+class EmbeddingCache:
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES, max_mb: float = EMBEDDING_CACHE_MAX_MB,
+                 path: Optional[str] = EMBEDDING_CACHE_PATH if EMBEDDING_CACHE_PERSIST else None):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.path = path
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize_key(text: str) -> str:
+        """Lowercase and collapse whitespace so trivial variants share an entry"""
+        return ' '.join(str(text).lower().split())
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.normalize_key(text)
+        with self.lock:
+            embedding = self.entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, text: str, embedding: np.ndarray):
+        key = self.normalize_key(text)
+        with self.lock:
+            if key in self.entries:
+                self.current_bytes -= self.entries.pop(key).nbytes
+            self.entries[key] = embedding
+            self.current_bytes += embedding.nbytes
+            
+            while self.entries and (len(self.entries) > self.max_entries or self.current_bytes > self.max_bytes):
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'memory_bytes': self.current_bytes,
+                'max_memory_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'persistent': self.path is not None
+            }
+
+    def keys_path(self) -> str:
+        return os.path.splitext(self.path)[0] + '.keys.json'
+
+    def save(self):
+        """Snapshot the cache as an .npy matrix plus a key list"""
+        if not self.path:
+            return
+        
+        try:
+            with self.lock:
+                keys = list(self.entries.keys())
+                if not keys:
+                    return
+                matrix = np.vstack([self.entries[key] for key in keys]).astype(np.float32)
+            
+            # Write to temp files first; the old snapshot may still be memory-mapped
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, matrix)
+            with open(self.keys_path() + '.tmp', 'w') as f:
+                json.dump(keys, f)
+            os.replace(tmp_path, self.path)
+            os.replace(self.keys_path() + '.tmp', self.keys_path())
+            print(f"Saved {len(keys)} cached embeddings")
+        except Exception as e:
+            print(f"Error saving embedding cache: {e}")
+
+    def load(self):
+        """Warm the cache from a memory-mapped snapshot"""
+        if not self.path or not os.path.exists(self.path) or not os.path.exists(self.keys_path()):
+            return
+        
+        try:
+            matrix = np.load(self.path, mmap_mode='r')
+            with open(self.keys_path(), 'r') as f:
+                keys = json.load(f)
+            
+            if matrix.ndim != 2 or len(keys) != matrix.shape[0]:
+                print("⚠️ Embedding cache snapshot is inconsistent, ignoring")
+                return
+            
+            for key, row in zip(keys, matrix):
+                self.put(key, row)
+            print(f"Loaded {len(self.entries)} cached embeddings")
+        except Exception as e:
+            print(f"Error loading embedding cache: {e}")
+
+# Incrementally maintained TF-IDF index over learned transaction text
+class TransactionTextIndex:
+    def __init__(self, n_features: int = TEXT_INDEX_FEATURES, reweight_growth: float = 1.25):
+        # Hashing needs no fitted vocabulary, so new rows never force a refit
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            stop_words='english',
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None
+        )
+        self.n_features = n_features
+        self.reweight_growth = reweight_growth
+        self.counts = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        self.pending_counts = []
+        self.doc_freq = np.zeros(n_features, dtype=np.int32)
+        self.idf = None
+        self.idf_doc_count = 0
+        self.matrix = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return self.counts.shape[0] + sum(rows.shape[0] for rows in self.pending_counts)
+
+    def add(self, texts: List[str]):
+        """Append rows; weighting is deferred until the next query"""
+        if not texts:
+            return
+        counts = self.vectorizer.transform(texts).astype(np.float32).tocsr()
+        with self.lock:
+            np.add.at(self.doc_freq, counts.indices, 1)
+            self.pending_counts.append(counts)
+
+    def remove_oldest(self, count: int):
+        """Drop the first rows, keeping the index aligned with a trimmed history"""
+        if count <= 0:
+            return
+        with self.lock:
+            self.consolidate()
+            removed = self.counts[:count]
+            np.subtract.at(self.doc_freq, removed.indices, 1)
+            self.counts = self.counts[count:]
+            self.matrix = self.matrix[min(count, self.matrix.shape[0]):]
+
+    def rebuild(self):
+        """Force a full IDF recomputation on the next query"""
+        with self.lock:
+            self.idf = None
+
+    def consolidate(self):
+        if self.pending_counts:
+            self.counts = sparse.vstack([self.counts] + self.pending_counts, format='csr')
+            self.pending_counts = []
+
+    def weight(self, counts):
+        if counts.shape[0] == 0:
+            return sparse.csr_matrix(counts.shape, dtype=np.float32)
+        return normalize(counts.multiply(self.idf).tocsr())
+
+    def refresh(self):
+        """Weight new rows, re-weighting everything only once the corpus has grown enough"""
+        self.consolidate()
+        n_docs = self.counts.shape[0]
+        
+        # No IDF can be fitted over an empty window; lookups score zero until rows arrive
+        if n_docs == 0:
+            self.idf = None
+            self.matrix = sparse.csr_matrix((0, self.n_features), dtype=np.float32)
+            return
+        
+        if self.idf is None or n_docs > self.idf_doc_count * self.reweight_growth:
+            self.idf = (np.log((1.0 + n_docs) / (1.0 + self.doc_freq)) + 1.0).astype(np.float32)
+            self.idf_doc_count = n_docs
+            self.matrix = self.weight(self.counts)
+        elif self.matrix.shape[0] < n_docs:
+            new_rows = self.weight(self.counts[self.matrix.shape[0]:])
+            self.matrix = sparse.vstack([self.matrix, new_rows], format='csr')
+
+    def similarity(self, text: str, candidates: List[str]) -> np.ndarray:
+        """Cosine similarity of one text against arbitrary candidate texts, using the index IDF"""
+        if not candidates:
+            return np.zeros(0, dtype=np.float32)
+        with self.lock:
+            self.refresh()
+            if self.idf is None:
+                return np.zeros(len(candidates), dtype=np.float32)
+            vectors = self.weight(self.vectorizer.transform([text] + list(candidates)).astype(np.float32))
+            return (vectors[1:] @ vectors[0].T).toarray().ravel()
+
+    def query(self, text: str) -> np.ndarray:
+        """Cosine similarity of one text against every indexed row"""
+        with self.lock:
+            self.refresh()
+            if self.matrix.shape[0] == 0:
+                return np.zeros(0, dtype=np.float32)
+            query_vector = self.weight(self.vectorizer.transform([text]).astype(np.float32))
+            return (self.matrix @ query_vector.T).toarray().ravel()
+
+# Indexed SQLite storage for learned transactions
+class TransactionStore:
+    columns = ('seq', 'user_id', 'item', 'amount', 'category', 'type', 'date')
+
+    def __init__(self, path: str = LEARNING_DB_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        
+        with self.lock, self.connection:
+            # WAL lets readers proceed during writes; NORMAL sync avoids an fsync per commit
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS transactions (
+                    seq INTEGER PRIMARY KEY,
+                    user_id TEXT NOT NULL DEFAULT 'default',
+                    item TEXT NOT NULL DEFAULT '',
+                    amount REAL NOT NULL DEFAULT 0,
+                    category TEXT,
+                    type TEXT,
+                    date TEXT
+                )
+            ''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (user_id, seq)')
+            self.connection.execute('DROP INDEX IF EXISTS idx_transactions_category')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user_category ON transactions (user_id, category, amount)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date)')
+
+    def add(self, record: Dict) -> int:
+        """Insert one learned transaction and return its sequence id"""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO transactions (seq, user_id, item, amount, category, type, date) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (record.get('seq'), record.get('user_id') or 'default', record.get('item', ''),
+                 float(record.get('amount') or 0), record.get('category'), record.get('type'), record.get('date'))
+            )
+            return cursor.lastrowid
+
+    def get(self, seq: int) -> Optional[Dict]:
+        with self.lock:
+            row = self.connection.execute('SELECT * FROM transactions WHERE seq = ?', (int(seq),)).fetchone()
+        return dict(row) if row else None
+
+    def get_many(self, seqs: List[int]) -> List[Dict]:
+        """Fetch rows by sequence id, in the order requested"""
+        seqs = [int(seq) for seq in seqs]
+        if not seqs:
+            return []
+        with self.lock:
+            rows = self.connection.execute(
+                f'SELECT * FROM transactions WHERE seq IN ({",".join("?" * len(seqs))})', seqs
+            ).fetchall()
+        by_seq = {row['seq']: dict(row) for row in rows}
+        return [by_seq[seq] for seq in seqs if seq in by_seq]
+
+    def count(self, user_id: str = None) -> int:
+        with self.lock:
+            if user_id is None:
+                return self.connection.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+            return self.connection.execute('SELECT COUNT(*) FROM transactions WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+    def user_counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.connection.execute('SELECT user_id, COUNT(*) FROM transactions GROUP BY user_id').fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def category_counts(self, user_id: str) -> Dict[str, int]:
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT category, COUNT(*) FROM transactions WHERE user_id = ? GROUP BY category', (user_id,)
+            ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def category_amounts(self, user_id: str, category: str) -> np.ndarray:
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT amount FROM transactions WHERE user_id = ? AND category = ?', (user_id, category)
+            ).fetchall()
+        return np.array([row[0] for row in rows], dtype=np.float64)
+
+    def recent(self, user_id: str, limit: int, columns: str = 'seq, item') -> List[sqlite3.Row]:
+        """A user's most recent rows in insertion order"""
+        with self.lock:
+            rows = self.connection.execute(
+                f'SELECT {columns} FROM transactions WHERE user_id = ? ORDER BY seq DESC LIMIT ?', (user_id, limit)
+            ).fetchall()
+        return rows[::-1]
+
+    def iter_rows(self, columns: str = '*', batch_size: int = 1000):
+        """Stream rows in sequence order without loading the whole table"""
+        last_seq = -1
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    f'SELECT seq, {columns} FROM transactions WHERE seq > ? ORDER BY seq LIMIT ?',
+                    (last_seq, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_seq = rows[-1]['seq']
+
+    def get_columns(self, user_id: str = None, start_date: str = None, end_date: str = None,
+                    batch_size: int = 5000) -> TransactionColumns:
+        """Rows as typed columns, read in batches so no full list of dicts is built"""
+        query = 'SELECT item, amount, category, type, date, user_id FROM transactions WHERE 1 = 1'
+        params = []
+        if user_id:
+            query += ' AND user_id = ?'
+            params.append(user_id)
+        if start_date:
+            query += ' AND date >= ?'
+            params.append(start_date)
+        if end_date:
+            query += ' AND date <= ?'
+            params.append(end_date)
+        
+        buffer = TransactionBuffer()
+        with self.lock:
+            cursor = self.connection.execute(query + ' ORDER BY seq', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    buffer.append(dict(row))
+        return buffer.to_columns()
+
+    def import_legacy(self, snapshot_path: str = LEGACY_SNAPSHOT_PATH, log_path: str = LEGACY_LOG_PATH) -> int:
+        """One-time import of learning_data.json and its append log"""
+        if self.count() > 0 or not (os.path.exists(snapshot_path) or os.path.exists(log_path)):
+            return 0
+        
+        records = []
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'r') as f:
+                records.extend(json.load(f))
+        if os.path.exists(log_path):
+            with open(log_path, 'r') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # Torn final record
+        
+        # Keep existing sequence ids so ANN snapshots stay valid
+        rows = []
+        next_seq = records[0].get('seq', 0) if records else 0
+        for record in records:
+            seq = record.get('seq', next_seq)
+            if seq < next_seq:
+                continue  # Log record already folded into the snapshot
+            rows.append((seq, record.get('user_id') or 'default', record.get('item', ''),
+                         float(record.get('amount') or 0), record.get('category'), record.get('type'), record.get('date')))
+            next_seq = seq + 1
+        
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO transactions (seq, user_id, item, amount, category, type, date) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+        
+        for path in (snapshot_path, log_path):
+            if os.path.exists(path):
+                os.replace(path, path + '.migrated')
+        print(f"Imported {len(rows)} legacy learned transactions into {self.path}")
+        return len(rows)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+# Materialized spending rollups kept next to the learned transactions
+class SpendingRollups:
+    def __init__(self, store: TransactionStore):
+        self.store = store
+        
+        with store.lock, store.connection:
+            # Per-category running count/sum plus Welford mean and M2 for the variance
+            store.connection.execute('''
+                CREATE TABLE IF NOT EXISTS rollup_category (
+                    user_id TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    total REAL NOT NULL,
+                    mean REAL NOT NULL,
+                    m2 REAL NOT NULL,
+                    PRIMARY KEY (user_id, category)
+                )
+            ''')
+            store.connection.execute('''
+                CREATE TABLE IF NOT EXISTS rollup_daily (
+                    user_id TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    total REAL NOT NULL,
+                    PRIMARY KEY (user_id, category, day)
+                )
+            ''')
+            # Weekday (0-6, Monday first) and calendar month (1-12) profiles, plus an 'all' row (bucket 0)
+            # counting every transaction whether or not it is dated or categorized
+            store.connection.execute('''
+                CREATE TABLE IF NOT EXISTS rollup_profile (
+                    user_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    total REAL NOT NULL,
+                    PRIMARY KEY (user_id, kind, bucket)
+                )
+            ''')
+        
+        if self.count() != store.count():
+            self.rebuild()
+
+    @staticmethod
+    def rollup_rows(record: Dict):
+        """Parameter tuples for the category, daily and profile upserts of one transaction"""
+        user_id = record.get('user_id') or 'default'
+        category = record.get('category') or ''
+        amount = float(record.get('amount') or 0)
+        
+        # Uncategorized rows get no category stats, as compute_aggregates drops NaN categories,
+        # but still count towards the daily totals (under '') and the profiles
+        category_rows = [(user_id, category, amount, amount)] if category else []
+        profile_rows = [(user_id, 'all', 0, amount)]
+        try:
+            date = pd.Timestamp(record.get('date') or record.get('entryDate'))
+        except (ValueError, TypeError):
+            return category_rows, [], profile_rows
+        if pd.isna(date):
+            return category_rows, [], profile_rows
+        
+        daily_rows = [(user_id, category, date.strftime('%Y-%m-%d'), amount)]
+        profile_rows += [(user_id, 'weekday', date.dayofweek, amount), (user_id, 'month', date.month, amount)]
+        return category_rows, daily_rows, profile_rows
+
+    def upsert(self, category_rows, daily_rows, profile_rows):
+        # SQLite evaluates every SET expression against the old row, so this is one Welford step
+        self.store.connection.executemany('''
+            INSERT INTO rollup_category (user_id, category, count, total, mean, m2) VALUES (?, ?, 1, ?, ?, 0)
+            ON CONFLICT (user_id, category) DO UPDATE SET
+                count = count + 1,
+                total = total + excluded.total,
+                mean = mean + (excluded.mean - mean) / (count + 1),
+                m2 = m2 + (excluded.mean - mean) * (excluded.mean - mean - (excluded.mean - mean) / (count + 1))
+        ''', category_rows)
+        self.store.connection.executemany('''
+            INSERT INTO rollup_daily (user_id, category, day, count, total) VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT (user_id, category, day) DO UPDATE SET count = count + 1, total = total + excluded.total
+        ''', daily_rows)
+        self.store.connection.executemany('''
+            INSERT INTO rollup_profile (user_id, kind, bucket, count, total) VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT (user_id, kind, bucket) DO UPDATE SET count = count + 1, total = total + excluded.total
+        ''', profile_rows)
+
+    def add(self, record: Dict):
+        """Fold one learned transaction into every rollup in constant time"""
+        category_rows, daily_rows, profile_rows = self.rollup_rows(record)
+        with self.store.lock, self.store.connection:
+            self.upsert(category_rows, daily_rows, profile_rows)
+
+    def rebuild(self):
+        """Recompute all rollups from the stored transactions"""
+        rebuilt = 0
+        # One locked transaction so learns cannot interleave with the reset
+        with self.store.lock, self.store.connection:
+            for table in ('rollup_category', 'rollup_daily', 'rollup_profile'):
+                self.store.connection.execute(f'DELETE FROM {table}')
+            
+            cursor = self.store.connection.execute('SELECT user_id, amount, category, date FROM transactions')
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                category_rows, daily_rows, profile_rows = [], [], []
+                for row in rows:
+                    category, daily, profile = self.rollup_rows(dict(row))
+                    category_rows.extend(category)
+                    daily_rows.extend(daily)
+                    profile_rows.extend(profile)
+                self.upsert(category_rows, daily_rows, profile_rows)
+                rebuilt += len(rows)
+        
+        if rebuilt:
+            print(f"Spending rollups rebuilt from {rebuilt} transactions")
+        return rebuilt
+
+    def count(self, user_id: str = None) -> int:
+        with self.store.lock:
+            if user_id is None:
+                row = self.store.connection.execute(
+                    "SELECT SUM(count) FROM rollup_profile WHERE kind = 'all'"
+                ).fetchone()
+            else:
+                row = self.store.connection.execute(
+                    "SELECT SUM(count) FROM rollup_profile WHERE kind = 'all' AND user_id = ?", (user_id,)
+                ).fetchone()
+        return row[0] or 0
+
+    def daily_series(self, user_id: str, category: str = None) -> pd.DataFrame:
+        """Daily totals in the (ds, y) shape the forecasters take"""
+        query = 'SELECT day, SUM(total) FROM rollup_daily WHERE user_id = ?'
+        params = [user_id]
+        if category:
+            query += ' AND category = ?'
+            params.append(category)
+        with self.store.lock:
+            rows = self.store.connection.execute(query + ' GROUP BY day ORDER BY day', params).fetchall()
+        return pd.DataFrame({
+            'ds': pd.to_datetime([row[0] for row in rows]),
+            'y': np.array([row[1] for row in rows], dtype=np.float64)
+        })
+
+    def get_aggregates(self, user_id: str) -> Dict:
+        """The InsightsEngine aggregate bundle, read from the rollups instead of raw rows"""
+        with self.store.lock:
+            category_rows = self.store.connection.execute(
+                "SELECT category, count, total, mean, m2 FROM rollup_category WHERE user_id = ? AND category != ''",
+                (user_id,)
+            ).fetchall()
+            profile_rows = self.store.connection.execute(
+                'SELECT kind, bucket, count, total FROM rollup_profile WHERE user_id = ? ORDER BY kind, bucket', (user_id,)
+            ).fetchall()
+        
+        counts = np.array([row['count'] for row in category_rows], dtype=np.float64)
+        m2 = np.array([row['m2'] for row in category_rows], dtype=np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stds = np.sqrt(np.maximum(m2, 0) / (counts - 1))
+        category_stats = pd.DataFrame({
+            'sum': [row['total'] for row in category_rows],
+            'mean': [row['mean'] for row in category_rows],
+            'std': stds,
+            'count': counts.astype(np.int64)
+        }, index=pd.Index([row['category'] for row in category_rows]))
+        
+        weekday = [row for row in profile_rows if row['kind'] == 'weekday']
+        month = [row for row in profile_rows if row['kind'] == 'month']
+        total = sum(row['count'] for row in profile_rows if row['kind'] == 'all')
+        
+        return {
+            'weekday_mean': pd.Series([row['total'] / row['count'] for row in weekday],
+                                      index=[WEEKDAY_NAMES[row['bucket']] for row in weekday], dtype=np.float64),
+            'month_mean': pd.Series([row['total'] / row['count'] for row in month],
+                                    index=[row['bucket'] for row in month], dtype=np.float64),
+            'category_stats': category_stats,
+            'daily_spending': self.daily_series(user_id),
+            'amount_quantiles': None,  # Not rollable; computed from whichever rows accompany the bundle
+            'count': int(total)
+        }
+
+# Per-category robust amount statistics maintained as transactions are learned
+class CategoryAnomalyModels:
+    def __init__(self, store: TransactionStore, user_id: str, min_samples: int = 5, threshold: float = 3.5):
+        self.store = store
+        self.user_id = user_id
+        self.min_samples = min_samples
+        # Modified z-score cut-off (Iglewicz & Hoaglin)
+        self.threshold = threshold
+        self.counts = None
+        self.models = {}
+        self.fits = 0
+        self.lock = threading.Lock()
+
+    def ensure_counts(self):
+        if self.counts is None:
+            self.counts = self.store.category_counts(self.user_id)
+
+    def add(self, category: str, amount: float):
+        with self.lock:
+            # Unloaded counts are read from the store later, which already includes this row
+            if self.counts is not None:
+                self.counts[category] = self.counts.get(category, 0) + 1
+
+    def get_model(self, category: str) -> Optional[Dict]:
+        """Return cached median/MAD for the category, refitting once enough new data has arrived"""
+        with self.lock:
+            self.ensure_counts()
+            count = self.counts.get(category, 0)
+            if count < self.min_samples:
+                return None
+            
+            model = self.models.get(category)
+            if model is not None:
+                stale_after = max(ANOMALY_REFIT_MIN, int(model['count'] * ANOMALY_REFIT_FRACTION))
+                if count - model['count'] < stale_after:
+                    return model
+        
+        # Only a refit reads the category's amounts, through the category index
+        amounts_array = self.store.category_amounts(self.user_id, category)
+        if len(amounts_array) < self.min_samples:
+            return None
+        
+        median = float(np.median(amounts_array))
+        deviations = np.abs(amounts_array - median)
+        # MAD scaled to match a normal standard deviation, with fallbacks for flat data
+        scale = float(np.median(deviations)) * 1.4826
+        if scale == 0:
+            scale = float(deviations.mean()) * 1.2533
+        if scale == 0:
+            scale = max(abs(median) * 0.05, 0.01)
+        
+        model = {'median': median, 'scale': scale, 'count': len(amounts_array)}
+        with self.lock:
+            self.models[category] = model
+            self.fits += 1
+        return model
+
+    def score(self, category: str, amount: float) -> Optional[Dict]:
+        """Constant-time anomaly score; negative values are anomalous"""
+        model = self.get_model(category)
+        if model is None:
+            return None
+        
+        robust_z = abs(amount - model['median']) / model['scale']
+        return {
+            'is_anomaly': robust_z > self.threshold,
+            'anomaly_score': float(np.clip((self.threshold - robust_z) / self.threshold, -1.0, 1.0))
+        }
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'categories': len(self.counts or {}),
+                'cached_models': len(self.models),
+                'fits': self.fits
+            }
+
+# Inverted-file (IVF) index over normalized embeddings
+class IVFIndex:
+    def __init__(self, dim: int = None, nprobe: int = ANN_NPROBE, train_threshold: int = 1024):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.vectors = None
+        self.ids = None
+        self.size = 0
+        self.min_live_id = 0
+        self.centroids = None
+        self.assignments = None
+        self.trained_size = 0
+        self.lists = []
+        self.list_arrays = {}
+        # Bumped when rows move (compaction), so a retrain started before it is discarded
+        self.generation = 0
+        self.retraining = False
+        self.background_retrains = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return self.size
+
+    def ensure_capacity(self, extra: int):
+        capacity = 0 if self.vectors is None else self.vectors.shape[0]
+        if self.size + extra <= capacity:
+            return
+        new_capacity = max(1024, capacity * 2, self.size + extra)
+        vectors = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        assignments = np.full(new_capacity, -1, dtype=np.int32)
+        if self.vectors is not None:
+            vectors[:self.size] = self.vectors[:self.size]
+            ids[:self.size] = self.ids[:self.size]
+            assignments[:self.size] = self.assignments[:self.size]
+        self.vectors, self.ids, self.assignments = vectors, ids, assignments
+
+    def add(self, ids: List[int], embeddings: np.ndarray):
+        """Insert rows; assigned to their nearest centroid once the index is trained"""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if embeddings.shape[0] == 0:
+            return
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        embeddings = embeddings / norms
+        
+        with self.lock:
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+            self.ensure_capacity(len(embeddings))
+            start = self.size
+            self.vectors[start:start + len(embeddings)] = embeddings
+            self.ids[start:start + len(embeddings)] = ids
+            self.size += len(embeddings)
+            
+            if self.centroids is not None:
+                self.assign(np.arange(start, self.size))
+            
+            # Train once there is enough data; re-train off the caller's thread as the index grows
+            if self.centroids is None and self.size >= self.train_threshold:
+                self.train()
+            elif self.centroids is not None and self.size > self.trained_size * 2 and not self.retraining:
+                self.retraining = True
+                threading.Thread(target=self.retrain, args=(self.vectors, self.size, self.generation),
+                                 name='ivf-retrain', daemon=True).start()
+
+    @staticmethod
+    def nearest_cells(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+        return np.concatenate([
+            (vectors[start:start + chunk_size] @ centroids.T).argmax(axis=1)
+            for start in range(0, len(vectors), chunk_size)
+        ]).astype(np.int32) if len(vectors) else np.zeros(0, dtype=np.int32)
+
+    def assign(self, rows: np.ndarray):
+        nearest = self.nearest_cells(self.vectors[rows], self.centroids)
+        self.assignments[rows] = nearest
+        order = np.argsort(nearest, kind='stable')
+        cells, starts = np.unique(nearest[order], return_index=True)
+        for centroid, group in zip(cells, np.split(rows[order], starts[1:])):
+            self.lists[centroid].extend(group.tolist())
+            self.list_arrays.pop(int(centroid), None)
+
+    @staticmethod
+    def fit_quantizer(vectors: np.ndarray, count: int, iterations: int = 10, sample_size: int = 20000):
+        """Spherical k-means over the first count rows with ~4*sqrt(n) cells; returns (centroids, assignments)"""
+        # Smaller cells keep the rows scanned per probe low as the index grows
+        nlist = max(1, int(4 * np.sqrt(count)))
+        rng = np.random.default_rng(42)
+        sample = vectors[rng.choice(count, size=min(sample_size, count), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=min(nlist, len(sample)), replace=False)].copy()
+        
+        for _ in range(iterations):
+            nearest = (sample @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+        
+        return centroids, IVFIndex.nearest_cells(vectors[:count], centroids)
+
+    def install(self, centroids: np.ndarray, assignments: np.ndarray):
+        """Swap in a trained quantizer; rows added since it was fitted are assigned to the new cells"""
+        count = len(assignments)
+        self.centroids = centroids
+        self.assignments[:count] = assignments
+        self.assignments[count:self.size] = -1
+        self.trained_size = count
+        self.rebuild_lists()
+        if count < self.size:
+            self.assign(np.arange(count, self.size))
+
+    def train(self):
+        """Fit the coarse quantizer inline (the first training, on a small index)"""
+        with self.lock:
+            self.install(*self.fit_quantizer(self.vectors, self.size))
+
+    def retrain(self, vectors: np.ndarray, count: int, generation: int):
+        """Refit on a background thread; searches keep using the old cells until the swap"""
+        try:
+            # Rows below size never change in place, so the arrays can be read without the lock
+            centroids, assignments = self.fit_quantizer(vectors, count)
+            
+            # Also assign the rows added during the fit here, leaving only a few for the locked swap
+            while True:
+                with self.lock:
+                    if generation != self.generation:
+                        return
+                    if self.size - len(assignments) < 1024:
+                        self.install(centroids, assignments)
+                        # The cells were sized for count rows, so growth is measured from there
+                        self.trained_size = count
+                        self.background_retrains += 1
+                        return
+                    vectors, size = self.vectors, self.size
+                assignments = np.concatenate([
+                    assignments, self.nearest_cells(vectors[len(assignments):size], centroids)
+                ])
+        except Exception as e:
+            print(f"ANN index retrain error: {e}")
+        finally:
+            self.retraining = False
+
+    def remove_before(self, min_id: int):
+        """Tombstone rows with ids below min_id; they are dropped on the next compaction"""
+        with self.lock:
+            self.min_live_id = max(self.min_live_id, min_id)
+
+    def compact(self):
+        """Physically drop tombstoned rows"""
+        with self.lock:
+            if self.size == 0:
+                return
+            keep = np.nonzero(self.ids[:self.size] >= self.min_live_id)[0]
+            if len(keep) == self.size:
+                return
+            self.vectors = self.vectors[keep].copy()
+            self.ids = self.ids[keep].copy()
+            self.assignments = self.assignments[keep].copy()
+            self.size = len(keep)
+            self.generation += 1
+            self.rebuild_lists()
+
+    def rebuild_lists(self):
+        self.list_arrays = {}
+        if self.centroids is None:
+            self.lists = []
+            return
+        # Group rows by cell with one stable sort instead of a Python loop over every row
+        assignments = self.assignments[:self.size]
+        rows = np.flatnonzero(assignments >= 0)
+        rows = rows[np.argsort(assignments[rows], kind='stable')]
+        counts = np.bincount(assignments[rows], minlength=len(self.centroids))
+        self.lists = [cell.tolist() for cell in np.split(rows, np.cumsum(counts)[:-1])]
+
+    def list_rows(self, centroid: int) -> np.ndarray:
+        rows = self.list_arrays.get(centroid)
+        if rows is None:
+            rows = np.array(self.lists[centroid], dtype=np.int64)
+            self.list_arrays[centroid] = rows
+        return rows
+
+    def search(self, embedding: np.ndarray, k: int = 10):
+        """Return (ids, similarities) of the approximate top-k rows"""
+        query = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = query / norm
+        
+        with self.lock:
+            if self.size == 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            
+            if self.centroids is None:
+                rows = np.arange(self.size)
+            else:
+                scores = self.centroids @ query
+                nprobe = min(self.nprobe, len(scores))
+                probes = np.argpartition(-scores, nprobe - 1)[:nprobe]
+                rows = np.concatenate([self.list_rows(int(c)) for c in probes])
+            
+            rows = rows[self.ids[rows] >= self.min_live_id]
+            if len(rows) == 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            
+            similarities = self.vectors[rows] @ query
+            k = min(k, len(rows))
+            top = np.argpartition(-similarities, k - 1)[:k]
+            top = top[np.argsort(-similarities[top])]
+            return self.ids[rows[top]].copy(), similarities[top]
+
+    def save(self, path: str):
+        with self.lock:
+            self.compact()
+            np.savez(
+                path,
+                vectors=self.vectors[:self.size] if self.size else np.zeros((0, self.dim or 0), dtype=np.float32),
+                ids=self.ids[:self.size] if self.size else np.zeros(0, dtype=np.int64),
+                assignments=self.assignments[:self.size] if self.size else np.zeros(0, dtype=np.int32),
+                centroids=self.centroids if self.centroids is not None else np.zeros((0, self.dim or 0), dtype=np.float32),
+                meta=np.array([self.min_live_id, self.trained_size], dtype=np.int64)
+            )
+
+    @classmethod
+    def load(cls, path: str) -> 'IVFIndex':
+        snapshot = np.load(path)
+        index = cls()
+        index.vectors = snapshot['vectors'].astype(np.float32)
+        index.ids = snapshot['ids'].astype(np.int64)
+        index.assignments = snapshot['assignments'].astype(np.int32)
+        index.size = len(index.ids)
+        index.dim = index.vectors.shape[1] if index.vectors.ndim == 2 and index.vectors.shape[1] else None
+        index.min_live_id, index.trained_size = (int(v) for v in snapshot['meta'])
+        index.centroids = snapshot['centroids'] if len(snapshot['centroids']) else None
+        index.rebuild_lists()
+        return index
+
+# Per-user partitions of IVF indexes with on-disk snapshots
+class PartitionedANNIndex:
+    def __init__(self, snapshot_dir: str = ANN_INDEX_DIR, max_partitions: int = MAX_ACTIVE_USERS):
+        self.snapshot_dir = snapshot_dir
+        self.max_partitions = max(1, max_partitions)
+        self.partitions = OrderedDict()
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def partition_path(self, partition: str) -> str:
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', partition or 'default')
+        return os.path.join(self.snapshot_dir, f'{safe_name}.npz')
+
+    def get_partition(self, partition: str) -> IVFIndex:
+        partition = partition or 'default'
+        with self.lock:
+            index = self.partitions.get(partition)
+            if index is None:
+                path = self.partition_path(partition)
+                try:
+                    index = IVFIndex.load(path) if os.path.exists(path) else IVFIndex()
+                except Exception as e:
+                    print(f"Error loading ANN snapshot {path}: {e}")
+                    index = IVFIndex()
+                self.partitions[partition] = index
+            self.partitions.move_to_end(partition)
+            
+            # Snapshot and drop the least recently used partitions
+            evicted = []
+            while len(self.partitions) > self.max_partitions:
+                evicted.append(self.partitions.popitem(last=False))
+                self.evictions += 1
+        
+        for name, evicted_index in evicted:
+            self.save_partition(name, evicted_index)
+        return index
+
+    def save_partition(self, partition: str, index: IVFIndex):
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            index.save(self.partition_path(partition))
+        except Exception as e:
+            print(f"Error saving ANN partition {partition}: {e}")
+
+    def add(self, partition: str, ids: List[int], embeddings: np.ndarray):
+        self.get_partition(partition).add(ids, embeddings)
+
+    def search(self, partition: str, embedding: np.ndarray, k: int = 10):
+        return self.get_partition(partition).search(embedding, k)
+
+    def save(self):
+        """Write a snapshot for every loaded partition"""
+        with self.lock:
+            partitions = list(self.partitions.items())
+        for partition, index in partitions:
+            self.save_partition(partition, index)
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'loaded_partitions': len(self.partitions),
+                'max_partitions': self.max_partitions,
+                'evictions': self.evictions,
+                'rows': sum(len(index) for index in self.partitions.values()),
+                'retraining': sum(index.retraining for index in self.partitions.values()),
+                'background_retrains': sum(index.background_retrains for index in self.partitions.values())
+            }
+
+# Learning state scoped to one user
+class UserLearningState:
+    def __init__(self, store: TransactionStore, user_id: str):
+        self.store = store
+        self.user_id = user_id
+        self.text_index = TransactionTextIndex()
+        self.text_index_seqs = []
+        self.text_index_loaded = False
+        self.lock = threading.Lock()
+        self.anomaly_models = CategoryAnomalyModels(store, user_id)
+
+    def ensure_text_index(self):
+        """Load the user's recent TF-IDF window from the store on first use"""
+        with self.lock:
+            if self.text_index_loaded:
+                return
+            rows = self.store.recent(self.user_id, LEARNING_HISTORY_LIMIT)
+            self.text_index.add([row['item'] for row in rows])
+            self.text_index_seqs = [row['seq'] for row in rows]
+            self.text_index_loaded = True
+
+    def most_similar(self, text: str):
+        """Return (seq, similarity) of the closest transaction in the window"""
+        self.ensure_text_index()
+        with self.lock:
+            similarities = self.text_index.query(text)
+            if len(similarities) == 0:
+                return None, 0.0
+            best = int(similarities.argmax())
+            return self.text_index_seqs[best], similarities[best]
+
+    def add(self, seq: int, record: Dict):
+        self.anomaly_models.add(record['category'], record['amount'])
+        
+        with self.lock:
+            if not self.text_index_loaded:
+                return  # The window picks this row up from the store when first used
+            self.text_index.add([record['item']])
+            self.text_index_seqs.append(seq)
+            
+            # Keep only the recent window, trimming in chunks so the index is not sliced on every call
+            overflow = len(self.text_index_seqs) - LEARNING_HISTORY_LIMIT
+            if overflow > max(1, LEARNING_HISTORY_LIMIT // 10):
+                self.text_index.remove_oldest(overflow)
+                self.text_index_seqs = self.text_index_seqs[overflow:]
+
+# LRU of per-user learning state
+class UserStateCache:
+    def __init__(self, store: TransactionStore, max_users: int = MAX_ACTIVE_USERS):
+        self.store = store
+        self.max_users = max(1, max_users)
+        self.states = OrderedDict()
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, user_id: str) -> UserLearningState:
+        user_id = user_id or 'default'
+        with self.lock:
+            state = self.states.get(user_id)
+            if state is None:
+                state = UserLearningState(self.store, user_id)
+                self.states[user_id] = state
+            self.states.move_to_end(user_id)
+            
+            # Inactive users are rebuilt lazily from the store when they return
+            while len(self.states) > self.max_users:
+                self.states.popitem(last=False)
+                self.evictions += 1
+            return state
+
+    def rebuild_text_indexes(self):
+        with self.lock:
+            states = list(self.states.values())
+        for state in states:
+            state.text_index.rebuild()
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'active_users': len(self.states),
+                'max_users': self.max_users,
+                'evictions': self.evictions,
+                'loaded_text_indexes': sum(1 for state in self.states.values() if state.text_index_loaded)
+            }
+
+# Aho-Corasick automaton over literal patterns; states are numbered breadth-first so each state's
+# children are one contiguous block and a transition is a str.find over that block
+class MultiPatternMatcher:
+    def __init__(self, patterns):
+        self.patterns = sorted({pattern for pattern in patterns if pattern})
+        
+        # Build the trie one depth at a time over the sorted patterns: nodes are created in the
+        # order of their prefixes, which groups siblings and keeps parents in creation order
+        chars = ['\0']  # Label of the edge into each state; the root has none
+        parents = array('i', [0])
+        terminal = array('i', [-1])  # Index of the pattern ending at each state
+        child_start = array('i')
+        states = array('i', [0]) * len(self.patterns)
+        active = list(range(len(self.patterns)))
+        depth = 0
+        while active:
+            next_active = []
+            last = None
+            for index in active:
+                pattern = self.patterns[index]
+                parent = states[index]
+                edge = (parent, pattern[depth])
+                if edge != last:
+                    while len(child_start) <= parent:
+                        child_start.append(len(chars))
+                    chars.append(pattern[depth])
+                    parents.append(parent)
+                    terminal.append(-1)
+                    last = edge
+                states[index] = len(chars) - 1
+                if len(pattern) > depth + 1:
+                    next_active.append(index)
+                else:
+                    terminal[-1] = index
+            active = next_active
+            depth += 1
+        while len(child_start) <= len(chars):
+            child_start.append(len(chars))
+        self.chars = ''.join(chars)
+        
+        # Failure links in breadth-first order; output links skip to the next state ending a pattern
+        fail = array('i', [0]) * len(chars)
+        output = array('i', [0]) * len(chars)
+        for state in range(1, len(chars)):
+            link = fail[parents[state]]
+            if parents[state]:
+                while True:
+                    child = self.chars.find(chars[state], child_start[link], child_start[link + 1])
+                    if child >= 0 or not link:
+                        break
+                    link = fail[link]
+                fail[state] = max(child, 0)
+            output[state] = state if terminal[state] >= 0 else output[fail[state]]
+        
+        self.child_start = child_start
+        self.fail = fail
+        self.output = output
+        self.terminal = terminal
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def iter_matches(self, text: str):
+        """Yield (end position, pattern) for every occurrence, overlapping ones included"""
+        chars, child_start, fail, output = self.chars, self.child_start, self.fail, self.output
+        state = 0
+        for position, char in enumerate(text):
+            while True:
+                child = chars.find(char, child_start[state], child_start[state + 1])
+                if child >= 0:
+                    state = child
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            
+            match = output[state]
+            while match:
+                yield position, self.patterns[self.terminal[match]]
+                match = output[fail[match]]
+
+    def find(self, text: str) -> set:
+        """Distinct patterns occurring in the text"""
+        return {pattern for _, pattern in self.iter_matches(text)}
+
+    def get_stats(self) -> Dict:
+        return {
+            'patterns': len(self.patterns),
+            'states': len(self.chars),
+            'memory_bytes': sys.getsizeof(self.chars) + sum(
+                len(column) * column.itemsize for column in (self.child_start, self.fail, self.output, self.terminal)
+            )
+        }
+
+# Merchant name -> category entries loaded from MERCHANT_DICTIONARY_PATH, matched on word boundaries
+class MerchantDictionary:
+    def __init__(self, path: Optional[str] = MERCHANT_DICTIONARY_PATH):
+        self.path = path
+        self.rank = {}  # Lowercased name -> row, so earlier rows win like the built-in vendor list
+        self.categories = []
+        self.matcher = MultiPatternMatcher([])
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.rank)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        
+        try:
+            rank = {}
+            categories = []
+            with open(self.path, 'r', encoding='utf-8', newline='') as f:
+                rows = json.load(f).items() if self.path.endswith('.json') else csv.reader(f)
+                for row in rows:
+                    if len(row) < 2:
+                        continue
+                    name = ' '.join(str(row[0]).lower().split())
+                    category = str(row[1]).strip()
+                    if not name or not category or name in rank or (name, category.lower()) == ('name', 'category'):
+                        continue
+                    rank[name] = len(categories)
+                    categories.append(category)
+            
+            self.matcher = MultiPatternMatcher(rank)
+            self.rank = rank
+            self.categories = categories
+            print(f"✅ Loaded {len(rank)} merchants from {self.path}")
+        except Exception as e:
+            print(f"Error loading merchant dictionary: {e}")
+
+    def find(self, text: str) -> List[str]:
+        """Merchants named in lowercased text, in dictionary order"""
+        found = set()
+        for end, name in self.matcher.iter_matches(text):
+            start = end - len(name) + 1
+            if ((start == 0 or not text[start - 1].isalnum()) and
+                    (end + 1 == len(text) or not text[end + 1].isalnum())):
+                found.add(name)
+        return sorted(found, key=self.rank.get)
+
+    def category(self, name: str) -> str:
+        return self.categories[self.rank[name]]
+
+    def get_stats(self) -> Dict:
+        return {
+            'merchants': len(self.rank),
+            'path': self.path or None,
+            'matcher': self.matcher.get_stats()
+        }
+
 # Advanced AI Components
 class AdvancedCategorizer:
-    def __init__(self):
+    def __init__(self, merchants: MerchantDictionary = None):
         # Initialize BERT for semantic understanding
         try:
             self.tokenizer = AutoTokenizer.from_pretrained('bert-base-uncased')
@@ -97,8 +1353,15 @@ class AdvancedCategorizer:
             print(f"⚠️ BERT not available: {e}")
             self.bert_available = False
         
+        # Reuse embeddings for repeated merchant names
+        self.embedding_cache = EmbeddingCache()
+        if self.bert_available:
+            self.embedding_cache.load()
+        
         # Enhanced category mappings with semantic understanding
-        self.category_embeddings = {}
+        self.category_context_matrix = None
+        self.category_context_labels = []
+        self.category_context_signature = None
         self.expense_categories = {
             'Rent': {
                 'keywords': ['rent', 'apartment', 'house payment', 'mortgage', 'housing', 'lease', 'property'],
@@ -142,41 +1405,151 @@ class AdvancedCategorizer:
             }
         }
         
-        # Initialize TF-IDF vectorizer for text similarity
-        self.tfidf_vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
+        # Precompute semantic context embeddings and the keyword automaton once
+        self.build_category_embeddings()
+        self.merchants = merchants or MerchantDictionary(None)
+        self.build_keyword_index()
+        
+        # ANN index over learned embeddings; ids are store sequence numbers
+        self.ann_index = PartitionedANNIndex()
         
-        # Load or initialize transaction history for learning
-        self.transaction_history = []
+        # Learned transactions live in SQLite; per-user TF-IDF windows and anomaly models load lazily
+        self.store = TransactionStore()
+        self.user_states = UserStateCache(self.store)
         self.load_learning_data()
+        self.rollups = SpendingRollups(self.store)
+        
+        # Per-user history sizes kept in memory so categorization never counts rows in SQLite
+        self.history_counts = self.store.user_counts()
+        self.history_lock = threading.Lock()
 
     def get_bert_embedding(self, text):
         """Get BERT embedding for text"""
-        if not self.bert_available:
-            return None
+        return self.get_bert_embeddings([text])[0]
+
+    def get_bert_embeddings(self, texts: List[str], batch_size: int = None) -> List[Optional[np.ndarray]]:
+        """Get BERT embeddings for many texts using length-bucketed batches"""
+        embeddings = [None] * len(texts)
+        if not self.bert_available or not texts:
+            return embeddings
+        
+        batch_size = batch_size or BERT_BATCH_SIZE
+        
+        # Serve repeated texts from the cache; only misses reach the model
+        missing = []
+        for i, text in enumerate(texts):
+            embeddings[i] = self.embedding_cache.get(text)
+            if embeddings[i] is None:
+                missing.append(i)
+        
+        if not missing:
+            return embeddings
         
         try:
-            inputs = self.tokenizer(text, return_tensors='pt', truncation=True, padding=True, max_length=128)
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                embedding = outputs.last_hidden_state.mean(dim=1).squeeze().numpy()
-            return embedding
+            # Tokenize once without padding so batches can be grouped by length
+            encoded = self.tokenizer([texts[i] for i in missing], truncation=True, max_length=128)
         except Exception as e:
-            print(f"BERT embedding error: {e}")
-            return None
+            print(f"BERT tokenization error: {e}")
+            return embeddings
+        
+        order = sorted(range(len(missing)), key=lambda i: len(encoded['input_ids'][i]))
+        
+        for start in range(0, len(order), batch_size):
+            batch_indices = order[start:start + batch_size]
+            try:
+                inputs = self.tokenizer.pad(
+                    {key: [encoded[key][i] for i in batch_indices] for key in encoded.keys()},
+                    return_tensors='pt'
+                )
+                with torch.no_grad():
+                    outputs = self.model(**inputs)
+                    # Mean over real tokens only so padding does not dilute short texts
+                    mask = inputs['attention_mask'].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+                    summed = (outputs.last_hidden_state * mask).sum(dim=1)
+                    pooled = (summed / mask.sum(dim=1).clamp(min=1)).numpy()
+                for row, idx in enumerate(batch_indices):
+                    # Copy so the cache does not pin the whole batch array
+                    embedding = pooled[row].copy()
+                    embeddings[missing[idx]] = embedding
+                    self.embedding_cache.put(texts[missing[idx]], embedding)
+            except Exception as e:
+                print(f"BERT embedding error: {e}")
+        
+        return embeddings
+
+    def get_category_context_signature(self):
+        """Hashable snapshot of the semantic contexts in the category table"""
+        return tuple(
+            (category, tuple(info.get('semantic_context', [])))
+            for category, info in self.expense_categories.items()
+        )
+
+    def build_category_embeddings(self):
+        """Embed every category semantic context into one row-normalized matrix"""
+        self.category_context_signature = self.get_category_context_signature()
+        self.category_context_matrix = None
+        self.category_context_labels = []
+        
+        if not self.bert_available:
+            return
+        
+        contexts = [(category, context)
+                    for category, category_contexts in self.category_context_signature
+                    for context in category_contexts]
+        embeddings = self.get_bert_embeddings([context for _, context in contexts])
+        
+        rows = []
+        labels = []
+        for (category, _), embedding in zip(contexts, embeddings):
+            if embedding is not None:
+                rows.append(embedding)
+                labels.append(category)
+        
+        if rows:
+            matrix = np.vstack(rows).astype(np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.category_context_matrix = matrix / norms
+            self.category_context_labels = labels
+            print(f"✅ Precomputed {len(labels)} category context embeddings")
+
+    def build_keyword_index(self):
+        """Automaton over every category keyword and its words, mapped back to (category, keyword)"""
+        keyword_refs = {}
+        word_refs = {}
+        empty_refs = []
+        for category_rank, (category, info) in enumerate(self.expense_categories.items()):
+            for keyword_rank, keyword in enumerate(info.get('keywords', [])):
+                ref = (category_rank, keyword_rank, category, keyword)
+                if not keyword:
+                    empty_refs.append(ref)  # Matches any text, scoring nothing
+                    continue
+                keyword_refs.setdefault(keyword, []).append(ref)
+                for word in set(keyword.split()):
+                    word_refs.setdefault(word, []).append(ref)
+        
+        # Swapped in as one tuple so concurrent lookups never see a half-built index
+        self.keyword_index = (MultiPatternMatcher(list(keyword_refs) + list(word_refs)),
+                              keyword_refs, word_refs, empty_refs)
 
-    def advanced_categorize(self, item_description: str, amount: float = None, transaction_type: str = "expense") -> Dict:
+    def update_categories(self, categories: Dict):
+        """Add or replace categories and refresh the context embeddings and keyword index"""
+        self.expense_categories.update(categories)
+        self.build_category_embeddings()
+        self.build_keyword_index()
+
+    def advanced_categorize(self, item_description: str, amount: float = None, transaction_type: str = "expense",
+                            item_embedding: np.ndarray = None, user_id: str = "default") -> Dict:
         """Advanced categorization using multiple AI techniques"""
+        # A null user_id is the default user everywhere: history counts, ANN partitions and learning state
+        user_id = user_id or 'default'
         
         # Traditional keyword matching
         keyword_result = self.keyword_categorize(item_description, transaction_type)
         
         # Semantic similarity using BERT
         if self.bert_available:
-            semantic_result = self.semantic_categorize(item_description, transaction_type)
+            semantic_result = self.semantic_categorize(item_description, transaction_type, item_embedding)
             
             # Combine results with weighted scoring
             if semantic_result and keyword_result:
@@ -195,42 +1568,74 @@ class AdvancedCategorizer:
             result = keyword_result
         
         # Historical pattern matching
-        if self.transaction_history:
-            historical_match = self.find_historical_patterns(item_description, amount)
+        if self.history_size(user_id):
+            historical_match = self.find_historical_patterns(item_description, amount, user_id, item_embedding)
             if historical_match and historical_match['confidence'] > result['confidence']:
                 result = historical_match
         
         # Anomaly detection for amount
         if amount:
-            anomaly_info = self.detect_amount_anomaly(result['category'], amount)
+            anomaly_info = self.detect_amount_anomaly(result['category'], amount, user_id)
             if anomaly_info['is_anomaly']:
                 result['anomaly_detected'] = True
                 result['anomaly_score'] = anomaly_info['anomaly_score']
         
         return result
 
-    def semantic_categorize(self, item_description: str, transaction_type: str) -> Dict:
-        """Categorize using semantic similarity with BERT embeddings"""
+    def embedding_indices(self, transactions: TransactionColumns) -> np.ndarray:
+        """Rows whose categorization uses a BERT embedding (a missing type counts as an expense)"""
         if not self.bert_available:
+            return np.empty(0, dtype=np.int64)
+        type_codes = transactions.codes['type']
+        return np.flatnonzero((type_codes == transactions.code('type', 'expense')) | (type_codes < 0))
+
+    def advanced_categorize_batch(self, transactions: TransactionColumns,
+                                  embeddings: List[Optional[np.ndarray]] = None) -> List[Dict]:
+        """Categorize many transactions with one batched BERT pass (or given embeddings), preserving input order"""
+        if embeddings is None:
+            embeddings = [None] * len(transactions)
+            expense_indices = self.embedding_indices(transactions)
+            expense_embeddings = self.get_bert_embeddings([transactions.items[i] for i in expense_indices])
+            for i, embedding in zip(expense_indices, expense_embeddings):
+                embeddings[i] = embedding
+        
+        results = []
+        for index, embedding in enumerate(embeddings):
+            t = transactions.row(index)
+            results.append(self.advanced_categorize(
+                t['item'],
+                t['amount'],
+                t['type'] or 'expense',
+                item_embedding=embedding,
+                user_id=t['user_id'] or 'default'
+            ))
+        return results
+
+    def semantic_categorize(self, item_description: str, transaction_type: str, item_embedding: np.ndarray = None) -> Dict:
+        """Categorize using semantic similarity with BERT embeddings"""
+        if not self.bert_available or transaction_type != 'expense':
+            return None
+        
+        # Rebuild context embeddings if the category table was edited in place
+        if self.get_category_context_signature() != self.category_context_signature:
+            self.build_category_embeddings()
+        
+        if self.category_context_matrix is None:
             return None
         
-        item_embedding = self.get_bert_embedding(item_description)
+        if item_embedding is None:
+            item_embedding = self.get_bert_embedding(item_description)
         if item_embedding is None:
             return None
         
-        categories = self.expense_categories if transaction_type == 'expense' else {}
-        best_match = None
-        highest_similarity = 0
-        
-        for category, info in categories.items():
-            # Create embeddings for semantic context
-            for context in info['semantic_context']:
-                context_embedding = self.get_bert_embedding(context)
-                if context_embedding is not None:
-                    similarity = cosine_similarity([item_embedding], [context_embedding])[0][0]
-                    if similarity > highest_similarity:
-                        highest_similarity = similarity
-                        best_match = category
+        # One matrix-vector product scores the item against every context
+        item_norm = np.linalg.norm(item_embedding)
+        if item_norm == 0:
+            return None
+        similarities = self.category_context_matrix @ (item_embedding.astype(np.float32) / item_norm)
+        best_idx = int(similarities.argmax())
+        highest_similarity = float(similarities[best_idx])
+        best_match = self.category_context_labels[best_idx] if highest_similarity > 0 else None
         
         if best_match and highest_similarity > 0.3:
             return {
@@ -248,23 +1653,35 @@ class AdvancedCategorizer:
         
         category_scores = {}
         
-        for category, info in categories.items():
-            score = 0
-            matched_keywords = []
+        if categories:
+            matcher, keyword_refs, word_refs, empty_refs = self.keyword_index
             
-            for keyword in info['keywords']:
-                if keyword in item_lower:
-                    score += len(keyword) * 2
-                    matched_keywords.append(keyword)
-                elif any(word in item_lower for word in keyword.split()):
-                    score += 1
-                    matched_keywords.append(keyword)
+            # A keyword found whole scores twice its length; otherwise any of its words found scores 1
+            hits = dict.fromkeys(empty_refs, True)
+            for pattern in matcher.find(item_lower):
+                for ref in keyword_refs.get(pattern, ()):
+                    hits[ref] = True
+                for ref in word_refs.get(pattern, ()):
+                    hits.setdefault(ref, False)
             
-            if score > 0:
-                category_scores[category] = {
-                    'score': score,
-                    'matched_keywords': matched_keywords
-                }
+            matches = {}
+            for (_, _, category, keyword), whole in sorted(hits.items()):
+                match = matches.setdefault(category, {'score': 0, 'matched_keywords': []})
+                match['score'] += len(keyword) * 2 if whole else 1
+                match['matched_keywords'].append(keyword)
+            
+            # Dictionary merchants count as whole keywords of their category
+            for name in self.merchants.find(item_lower):
+                category = self.merchants.category(name)
+                if category in categories:
+                    match = matches.setdefault(category, {'score': 0, 'matched_keywords': []})
+                    match['score'] += len(name) * 2
+                    match['matched_keywords'].append(name)
+            
+            # Category order breaks score ties
+            for category in categories:
+                if category in matches and matches[category]['score'] > 0:
+                    category_scores[category] = matches[category]
         
         if category_scores:
             best_category = max(category_scores.keys(), key=lambda x: category_scores[x]['score'])
@@ -282,49 +1699,74 @@ class AdvancedCategorizer:
             'reasoning': 'No keywords matched, using default'
         }
 
-    def find_historical_patterns(self, item_description: str, amount: float = None) -> Optional[Dict]:
+    def history_size(self, user_id: str = None) -> int:
+        """Number of learned transactions in the store, optionally for one user"""
+        with self.history_lock:
+            if user_id is None:
+                return sum(self.history_counts.values())
+            return self.history_counts.get(user_id, 0)
+
+    def find_historical_patterns(self, item_description: str, amount: float = None, user_id: str = "default",
+                                 item_embedding: np.ndarray = None) -> Optional[Dict]:
         """Find similar transactions in history"""
-        if not self.transaction_history:
-            return None
-        
-        # Create TF-IDF vectors for similarity comparison
-        descriptions = [t['item'] for t in self.transaction_history] + [item_description]
+        # Large histories: take ANN candidates, then re-score only those with TF-IDF
+        if item_embedding is not None and len(self.ann_index.get_partition(user_id)) >= ANN_MIN_ROWS:
+            try:
+                return self.find_ann_historical_patterns(item_description, user_id, item_embedding)
+            except Exception as e:
+                print(f"ANN pattern matching error: {e}")
         
         try:
-            tfidf_matrix = self.tfidf_vectorizer.fit_transform(descriptions)
-            similarities = cosine_similarity(tfidf_matrix[-1:], tfidf_matrix[:-1]).flatten()
-            
-            # Find most similar transaction
-            max_similarity_idx = similarities.argmax()
-            max_similarity = similarities[max_similarity_idx]
+            # Find most similar transaction in the user's own history
+            similar_seq, max_similarity = self.user_states.get(user_id).most_similar(item_description)
             
-            if max_similarity > 0.5:  # Threshold for similarity
-                similar_transaction = self.transaction_history[max_similarity_idx]
-                return {
-                    'category': similar_transaction['category'],
-                    'confidence': min(max_similarity, 0.9),
-                    'reasoning': f'Similar to previous transaction: {similar_transaction["item"]} (similarity: {max_similarity:.2f})'
-                }
+            if similar_seq is not None and max_similarity > 0.5:  # Threshold for similarity
+                similar_transaction = self.store.get(similar_seq)
+                if similar_transaction:
+                    return {
+                        'category': similar_transaction['category'],
+                        'confidence': min(max_similarity, 0.9),
+                        'reasoning': f'Similar to previous transaction: {similar_transaction["item"]} (similarity: {max_similarity:.2f})'
+                    }
         except Exception as e:
             print(f"Historical pattern matching error: {e}")
         
         return None
 
-    def detect_amount_anomaly(self, category: str, amount: float) -> Dict:
-        """Detect if the amount is anomalous for the category"""
-        category_amounts = [t['amount'] for t in self.transaction_history if t.get('category') == category]
+    def find_ann_historical_patterns(self, item_description: str, user_id: str, item_embedding: np.ndarray) -> Optional[Dict]:
+        """Historical match restricted to the user's approximate nearest neighbours"""
+        ids, _ = self.ann_index.search(user_id, item_embedding, ANN_CANDIDATES)
+        candidates = self.store.get_many(ids.tolist())
+        if not candidates:
+            return None
         
-        if len(category_amounts) < 5:  # Need at least 5 data points
-            return {'is_anomaly': False, 'anomaly_score': 0}
+        # The TF-IDF window is empty after a restart or eviction until loaded from the store
+        state = self.user_states.get(user_id)
+        state.ensure_text_index()
+        similarities = state.text_index.similarity(item_description, [t['item'] for t in candidates])
+        best = int(similarities.argmax())
+        max_similarity = similarities[best]
+        
+        if max_similarity > 0.5:
+            similar_transaction = candidates[best]
+            return {
+                'category': similar_transaction['category'],
+                'confidence': min(max_similarity, 0.9),
+                'reasoning': f'Similar to previous transaction: {similar_transaction["item"]} (similarity: {max_similarity:.2f})'
+            }
         
-        # Use Isolation Forest for anomaly detection
+        return None
+
+    def detect_amount_anomaly(self, category: str, amount: float, user_id: str = "default") -> Dict:
+        """Detect if the amount is anomalous for the category"""
+        # Score against the category's cached robust statistics; no model fit per request
         try:
-            amounts_array = np.array(category_amounts + [amount]).reshape(-1, 1)
-            iso_forest = IsolationForest(contamination=0.1, random_state=42)
-            anomaly_scores = iso_forest.fit_predict(amounts_array)
+            anomaly_info = self.user_states.get(user_id).anomaly_models.score(category, amount)
+            if anomaly_info is None:  # Need at least 5 data points
+                return {'is_anomaly': False, 'anomaly_score': 0}
             
-            is_anomaly = anomaly_scores[-1] == -1
-            anomaly_score = iso_forest.decision_function(amounts_array)[-1]
+            is_anomaly = anomaly_info['is_anomaly']
+            anomaly_score = anomaly_info['anomaly_score']
             
             return {
                 'is_anomaly': is_anomaly,
@@ -335,348 +1777,400 @@ class AdvancedCategorizer:
             print(f"Anomaly detection error: {e}")
             return {'is_anomaly': False, 'anomaly_score': 0}
 
-    def learn_from_transaction(self, transaction: Dict):
+    def learn_from_transaction(self, transaction: Dict, item_embedding: np.ndarray = None):
         """Learn from new transactions to improve categorization"""
-        self.transaction_history.append({
+        record = {
             'item': transaction.get('item', ''),
             'amount': transaction.get('amount', 0),
             'category': transaction.get('category', ''),
             'type': transaction.get('type', ''),
-            'date': transaction.get('entryDate', '')
-        })
-        
-        # Keep only recent transactions (last 1000)
-        if len(self.transaction_history) > 1000:
-            self.transaction_history = self.transaction_history[-1000:]
-        
-        # Save learning data
-        self.save_learning_data()
+            'date': transaction.get('entryDate', ''),
+            'user_id': transaction.get('user_id') or 'default'
+        }
+        seq = self.store.add(record)
+        self.rollups.add(record)
+        with self.history_lock:
+            self.history_counts[record['user_id']] = self.history_counts.get(record['user_id'], 0) + 1
+        
+        self.user_states.get(record['user_id']).add(seq, record)
+        if item_embedding is not None:
+            self.ann_index.add(record['user_id'], [seq], item_embedding)
 
-    def save_learning_data(self):
-        """Save learning data to file"""
-        try:
-            with open('learning_data.json', 'w') as f:
-                json.dump(self.transaction_history, f)
-        except Exception as e:
-            print(f"Error saving learning data: {e}")
+    def backfill_ann_index(self):
+        """Embed learned transactions that are not in the ANN index yet"""
+        if not self.bert_available:
+            return 0
+        
+        indexed_ids = {}
+        backfilled = 0
+        for rows in self.store.iter_rows('user_id, item'):
+            missing = []
+            for row in rows:
+                partition = row['user_id']
+                if partition not in indexed_ids:
+                    index = self.ann_index.get_partition(partition)
+                    indexed_ids[partition] = set(index.ids[:index.size].tolist()) if index.size else set()
+                if row['seq'] not in indexed_ids[partition]:
+                    missing.append(row)
+            
+            embeddings = self.get_bert_embeddings([row['item'] for row in missing])
+            for row, embedding in zip(missing, embeddings):
+                if embedding is not None:
+                    self.ann_index.add(row['user_id'], [row['seq']], embedding)
+                    backfilled += 1
+        
+        self.ann_index.save()
+        return backfilled
 
     def load_learning_data(self):
-        """Load learning data from file"""
+        """Import legacy learning files into the store"""
         try:
-            if os.path.exists('learning_data.json'):
-                with open('learning_data.json', 'r') as f:
-                    self.transaction_history = json.load(f)
-                print(f"Loaded {len(self.transaction_history)} transactions for learning")
+            self.store.import_legacy()
+            print(f"Learning store has {self.store.count()} transactions")
         except Exception as e:
             print(f"Error loading learning data: {e}")
 
-# Time Series Prediction Engine
-class SpendingPredictor:
-    def __init__(self):
-        self.models = {}
-        
-    def prepare_time_series_data(self, transactions: List[Dict], category: str = None) -> pd.DataFrame:
-        """Prepare transaction data for time series analysis"""
-        df = pd.DataFrame(transactions)
-        df['date'] = pd.to_datetime(df['entryDate'])
-        
-        if category:
-            df = df[df['category'] == category]
-        
-        # Aggregate by day
-        daily_spending = df.groupby(df['date'].dt.date)['amount'].sum().reset_index()
-        daily_spending.columns = ['ds', 'y']
-        daily_spending['ds'] = pd.to_datetime(daily_spending['ds'])
-        
-        return daily_spending
+# Request coalescing in front of the BERT model
+class EmbeddingBatcher:
+    def __init__(self, embed_fn: Callable[[List[str]], List[Optional[np.ndarray]]],
+                 max_batch_size: int = EMBED_MAX_BATCH, window_ms: float = EMBED_BATCH_WINDOW_MS):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = window_ms / 1000.0
+        # A single worker keeps model inference serial and off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bert-batcher')
+        self.pending = []
+        self.flush_handle = None
+        self.batches_run = 0
+        self.items_embedded = 0
 
-    def predict_spending(self, transactions: List[Dict], category: str = None, days_ahead: int = 30) -> Dict:
-        """Predict future spending using Prophet"""
-        try:
-            df = self.prepare_time_series_data(transactions, category)
-            
-            if len(df) < 10:  # Need sufficient data
-                return {
-                    'predicted_amount': 0,
-                    'confidence_interval': {'lower': 0, 'upper': 0},
-                    'trend': 'insufficient_data',
-                    'factors': ['Need more historical data for accurate predictions']
-                }
-            
-            # Initialize and fit Prophet model
-            model = Prophet(
-                yearly_seasonality=True,
-                weekly_seasonality=True,
-                daily_seasonality=False,
-                changepoint_prior_scale=0.05
-            )
-            
-            model.fit(df)
-            
-            # Make future predictions
-            future = model.make_future_dataframe(periods=days_ahead)
-            forecast = model.predict(future)
-            
-            # Get prediction for the period
-            future_predictions = forecast.tail(days_ahead)
-            total_predicted = future_predictions['yhat'].sum()
-            confidence_lower = future_predictions['yhat_lower'].sum()
-            confidence_upper = future_predictions['yhat_upper'].sum()
-            
-            # Analyze trend
-            recent_trend = forecast['trend'].tail(10).mean()
-            earlier_trend = forecast['trend'].head(10).mean()
-            trend_direction = 'increasing' if recent_trend > earlier_trend else 'decreasing'
-            
-            return {
-                'predicted_amount': max(0, total_predicted),
-                'confidence_interval': {
-                    'lower': max(0, confidence_lower),
-                    'upper': max(0, confidence_upper)
-                },
-                'trend': trend_direction,
-                'seasonality': {
-                    'weekly': forecast['weekly'].tail(7).mean(),
-                    'yearly': forecast['yearly'].tail(1).iloc[0] if 'yearly' in forecast.columns else 0
-                },
-                'factors': [
-                    f'Historical average: ${df["y"].mean():.2f}/day',
-                    f'Trend: {trend_direction}',
-                    f'Prediction confidence: {((confidence_upper - confidence_lower) / total_predicted * 100):.1f}% range'
-                ]
-            }
-            
-        except Exception as e:
-            print(f"Prediction error: {e}")
-            return {
-                'predicted_amount': 0,
-                'confidence_interval': {'lower': 0, 'upper': 0},
-                'trend': 'error',
-                'factors': [f'Prediction failed: {str(e)}']
-            }
+    async def embed(self, text: str) -> Optional[np.ndarray]:
+        """Queue one text and wait for its embedding from the next batch"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((text, future))
+        
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.window, self.flush)
+        
+        return await future
 
-# Advanced Insights Engine
-class InsightsEngine:
-    def __init__(self):
-        self.predictor = SpendingPredictor()
-        
-    def generate_advanced_insights(self, transactions: List[Dict], budgets: Dict = None) -> List[Dict]:
-        """Generate advanced AI-powered insights"""
-        insights = []
-        
-        if not transactions:
-            return [{
-                'type': 'info',
-                'priority': 'low',
-                'title': 'Getting Started',
-                'message': 'Add transactions to unlock AI-powered insights',
-                'confidence': 1.0
-            }]
-        
-        # Convert to DataFrame for analysis
-        df = pd.DataFrame(transactions)
-        df['date'] = pd.to_datetime(df['entryDate'])
-        df['month'] = df['date'].dt.to_period('M')
-        
-        # Spending pattern analysis
-        insights.extend(self.analyze_spending_patterns(df))
-        
-        # Anomaly detection
-        insights.extend(self.detect_spending_anomalies(df))
-        
-        # Seasonal analysis
-        insights.extend(self.analyze_seasonality(df))
-        
-        # Budget optimization
-        if budgets:
-            insights.extend(self.optimize_budgets(df, budgets))
-        
-        # Predictive insights
-        insights.extend(self.generate_predictive_insights(transactions))
-        
-        # Sort by priority and confidence
-        priority_order = {'high': 3, 'medium': 2, 'low': 1}
-        insights.sort(key=lambda x: (priority_order.get(x['priority'], 0), x.get('confidence', 0)), reverse=True)
-        
-        return insights[:10]  # Return top 10 insights
+    async def embed_batch(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Embed an already batched request on the inference thread, without waiting for a window"""
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        embeddings = await loop.run_in_executor(self.executor, self.embed_fn, texts)
+        self.batches_run += 1
+        self.items_embedded += len(texts)
+        return embeddings
 
-    def analyze_spending_patterns(self, df: pd.DataFrame) -> List[Dict]:
-        """Analyze spending patterns using clustering"""
-        insights = []
-        
-        try:
-            # Analyze spending by day of week
-            df['day_of_week'] = df['date'].dt.day_name()
-            daily_spending = df.groupby('day_of_week')['amount'].mean()
-            
-            highest_day = daily_spending.idxmax()
-            highest_amount = daily_spending.max()
-            
-            insights.append({
-                'type': 'info',
-                'priority': 'medium',
-                'title': 'Spending Pattern',
-                'message': f'You spend most on {highest_day}s (avg: ${highest_amount:.2f})',
-                'confidence': 0.8,
-                'data': daily_spending.to_dict()
-            })
-            
-            # Analyze category distribution
-            category_spending = df.groupby('category')['amount'].sum().sort_values(ascending=False)
-            if len(category_spending) > 1:
-                top_category = category_spending.index[0]
-                top_amount = category_spending.iloc[0]
-                total_spending = category_spending.sum()
-                percentage = (top_amount / total_spending) * 100
-                
-                if percentage > 50:
-                    insights.append({
-                        'type': 'warning',
-                        'priority': 'high',
-                        'title': 'Spending Concentration',
-                        'message': f'{top_category} dominates your spending ({percentage:.1f}% of total)',
-                        'confidence': 0.9,
-                        'recommendation': 'Consider diversifying your expenses or reviewing this category'
-                    })
-            
-        except Exception as e:
-            print(f"Pattern analysis error: {e}")
-        
-        return insights
+    def flush(self):
+        """Send everything collected so far to the worker thread as one batch"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        
+        loop = asyncio.get_running_loop()
+        job = loop.run_in_executor(self.executor, self.embed_fn, [text for text, _ in batch])
+        job.add_done_callback(lambda done: self.resolve(batch, done))
 
-    def detect_spending_anomalies(self, df: pd.DataFrame) -> List[Dict]:
-        """Detect spending anomalies using machine learning"""
-        insights = []
-        
-        try:
-            if len(df) < 10:
-                return insights
-            
-            # Use Isolation Forest for anomaly detection
-            features = df[['amount']].values
-            iso_forest = IsolationForest(contamination=0.1, random_state=42)
-            anomalies = iso_forest.fit_predict(features)
-            
-            anomaly_transactions = df[anomalies == -1]
-            
-            if len(anomaly_transactions) > 0:
-                for _, transaction in anomaly_transactions.head(3).iterrows():  # Top 3 anomalies
-                    insights.append({
-                        'type': 'warning',
-                        'priority': 'medium',
-                        'title': 'Unusual Spending Detected',
-                        'message': f'${transaction["amount"]:.2f} for {transaction["item"]} is unusual for you',
-                        'confidence': 0.7,
-                        'data': {
-                            'transaction': transaction.to_dict(),
-                            'typical_range': f'${df["amount"].quantile(0.25):.2f} - ${df["amount"].quantile(0.75):.2f}'
-                        }
-                    })
-                    
-        except Exception as e:
-            print(f"Anomaly detection error: {e}")
-        
-        return insights
+    def resolve(self, batch, done):
+        """Hand each caller its own embedding (or the batch error)"""
+        self.batches_run += 1
+        self.items_embedded += len(batch)
+        error = done.exception()
+        
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
 
-    def analyze_seasonality(self, df: pd.DataFrame) -> List[Dict]:
-        """Analyze seasonal spending patterns"""
-        insights = []
-        
-        try:
-            if len(df) < 30:  # Need at least a month of data
-                return insights
-            
-            # Monthly spending analysis
-            monthly_spending = df.groupby(df['date'].dt.month)['amount'].mean()
-            
-            if len(monthly_spending) > 3:
-                highest_month = monthly_spending.idxmax()
-                lowest_month = monthly_spending.idxmin()
-                
-                month_names = ['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
-                              'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-                
-                insights.append({
-                    'type': 'info',
-                    'priority': 'medium',
-                    'title': 'Seasonal Pattern',
-                    'message': f'You typically spend more in {month_names[highest_month]} and less in {month_names[lowest_month]}',
-                    'confidence': 0.7,
-                    'data': monthly_spending.to_dict()
-                })
-                
-        except Exception as e:
-            print(f"Seasonality analysis error: {e}")
-        
-        return insights
+    def get_stats(self) -> Dict:
+        return {
+            'window_ms': self.window * 1000.0,
+            'max_batch_size': self.max_batch_size,
+            'pending': len(self.pending),
+            'batches_run': self.batches_run,
+            'items_embedded': self.items_embedded,
+            'avg_batch_size': self.items_embedded / self.batches_run if self.batches_run else 0
+        }
 
-    def optimize_budgets(self, df: pd.DataFrame, budgets: Dict) -> List[Dict]:
-        """Optimize budgets using historical data"""
-        insights = []
-        
-        try:
-            expense_budgets = budgets.get('expense', {})
-            
-            for category, budget in expense_budgets.items():
-                category_data = df[df['category'] == category]
-                
-                if len(category_data) > 5:  # Need sufficient data
-                    avg_spending = category_data['amount'].mean()
-                    std_spending = category_data['amount'].std()
-                    
-                    # Recommend budget adjustment
-                    recommended_budget = avg_spending + (2 * std_spending)  # 95% confidence interval
-                    
-                    if recommended_budget > budget * 1.2:
-                        insights.append({
-                            'type': 'suggestion',
-                            'priority': 'medium',
-                            'title': f'{category} Budget Optimization',
-                            'message': f'Consider increasing budget from ${budget} to ${recommended_budget:.2f}',
-                            'confidence': 0.8,
-                            'recommendation': f'Based on spending pattern: avg ${avg_spending:.2f} ± ${std_spending:.2f}'
-                        })
-                    elif recommended_budget < budget * 0.8:
-                        insights.append({
-                            'type': 'success',
-                            'priority': 'low',
-                            'title': f'{category} Budget Opportunity',
-                            'message': f'You could reduce budget from ${budget} to ${recommended_budget:.2f}',
-                            'confidence': 0.7,
-                            'recommendation': 'Free up budget for other categories'
-                        })
-                        
-        except Exception as e:
-            print(f"Budget optimization error: {e}")
-        
-        return insights
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
 
-    def generate_predictive_insights(self, transactions: List[Dict]) -> List[Dict]:
-        """Generate predictive insights"""
-        insights = []
-        
+# Bounded pool of worker processes for CPU-bound request work. Each worker is a single-process
+# executor, so one user's jobs always reach the same worker and reuse its Prophet cache
+class ComputePool:
+    def __init__(self, max_workers: int = COMPUTE_POOL_WORKERS, max_queue: int = COMPUTE_POOL_MAX_QUEUE,
+                 timeout: float = COMPUTE_POOL_TIMEOUT, start_method: str = COMPUTE_POOL_START_METHOD):
+        self.max_workers = max(0, max_workers)
+        self.max_queue = max(1, max_queue)
+        self.timeout = timeout
+        self.start_method = start_method
+        self.pools = [None] * self.max_workers
+        self.pending = 0
+        self.worker_pending = [0] * self.max_workers
+        # Worker index -> statistics reported with its latest job result
+        self.worker_stats = {}
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'timeouts': 0, 'rejected': 0, 'pool_restarts': 0}
+        self.total_seconds = 0.0
+
+    def get_pool(self, worker: int) -> ProcessPoolExecutor:
+        if self.pools[worker] is None:
+            context = multiprocessing.get_context(self.start_method) if self.start_method else None
+            if self.start_method == 'forkserver':
+                # Restarted workers fork from a server that already imported the job module
+                context.set_forkserver_preload(['compute_jobs'])
+            self.pools[worker] = ProcessPoolExecutor(max_workers=1, mp_context=context)
+        return self.pools[worker]
+
+    def restart_worker(self, worker: int, pool: ProcessPoolExecutor):
+        """Drop a crashed or stuck worker process; the next job routed to it starts a fresh one"""
+        if self.pools[worker] is not pool:
+            return  # Already replaced
+        self.pools[worker] = None
+        self.worker_stats.pop(worker, None)
+        self.stats['pool_restarts'] += 1
+        
+        # Killing the process fails its running and queued jobs with BrokenProcessPool, which frees
+        # their queue slots; before Python 3.14 the executor has no public call to stop a running job
+        kill_workers = getattr(pool, 'kill_workers', None)
+        if kill_workers is not None:
+            kill_workers()
+        else:
+            for process in list((pool._processes or {}).values()):
+                process.kill()
+            pool.shutdown(wait=False)
+
+    def pick_worker(self, affinity: str = None) -> int:
+        """The worker owning this affinity key (a user id), or the least busy one"""
+        if affinity is not None:
+            return zlib.crc32(str(affinity).encode('utf-8')) % self.max_workers
+        return min(range(self.max_workers), key=self.worker_pending.__getitem__)
+
+    def release(self, worker: Optional[int], job: asyncio.Future = None):
+        """Free a queue slot once its job has really finished, or failed to start"""
+        self.pending -= 1
+        if worker is not None:
+            self.worker_pending[worker] -= 1
+        # Mark the outcome of jobs nobody waits for any more as retrieved
+        if job is not None and not job.cancelled():
+            job.exception()
+
+    async def run(self, fn: Callable, *args, affinity: str = None, timeout: float = None):
+        """Run fn(*args) off the event loop; 429 when the queue is full, 504 on timeout"""
+        if self.pending >= self.max_queue:
+            self.stats['rejected'] += 1
+            raise HTTPException(status_code=429, detail="Server busy, please retry shortly")
+        
+        worker = self.pick_worker(affinity) if self.max_workers > 0 else None
+        self.pending += 1
+        if worker is not None:
+            self.worker_pending[worker] += 1
+        self.stats['submitted'] += 1
+        start_time = time.perf_counter()
+        pool = None
+        job = None
         try:
-            # Overall spending prediction
-            prediction = self.predictor.predict_spending(transactions, days_ahead=30)
-            
-            if prediction['predicted_amount'] > 0:
-                insights.append({
-                    'type': 'prediction',
-                    'priority': 'high',
-                    'title': 'Next 30-Day Prediction',
-                    'message': f'Predicted spending: ${prediction["predicted_amount"]:.2f} (trend: {prediction["trend"]})',
-                    'confidence': 0.7,
-                    'data': prediction
-                })
-                
-        except Exception as e:
-            print(f"Predictive insights error: {e}")
-        
-        return insights
+            if worker is not None:
+                pool = self.get_pool(worker)
+                job = asyncio.wrap_future(pool.submit(run_job, fn, *args))
+            else:
+                job = asyncio.ensure_future(run_in_threadpool(run_job, fn, *args))
+            # The job holds its queue slot until it finishes, even after its caller stops waiting
+            job.add_done_callback(lambda done: self.release(worker, done))
+            result, stats = await asyncio.wait_for(asyncio.shield(job), timeout or self.timeout)
+            if worker is not None:
+                self.worker_stats[worker] = stats
+            self.stats['completed'] += 1
+            return result
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            # A stuck worker would time out every job routed to it, so replace its process;
+            # a thread cannot be stopped and keeps its slot until the job returns
+            if worker is not None:
+                self.restart_worker(worker, pool)
+            raise HTTPException(status_code=504, detail="Processing timed out")
+        except BrokenProcessPool:
+            self.stats['failed'] += 1
+            self.restart_worker(worker, pool)
+            raise HTTPException(status_code=503, detail="Worker process crashed, please retry")
+        except Exception:
+            self.stats['failed'] += 1
+            raise
+        finally:
+            if job is None:
+                self.release(worker)
+            self.total_seconds += time.perf_counter() - start_time
+
+    def get_prophet_cache_stats(self) -> Dict:
+        """Prophet cache counters summed over the workers, as of each worker's latest job"""
+        if self.max_workers == 0:
+            return dict(worker_stats()['prophet_cache'], available=True, workers_reporting=1)
+        
+        reports = [stats['prophet_cache'] for stats in self.worker_stats.values()]
+        totals = {}
+        for report in reports:
+            for name, value in report.items():
+                totals[name] = totals.get(name, 0) + value
+        # Workers that have not finished a job yet have nothing to report
+        return dict(totals, available=bool(reports), workers_reporting=len(reports))
+
+    def get_stats(self) -> Dict:
+        finished = self.stats['completed'] + self.stats['failed'] + self.stats['timeouts']
+        return dict(
+            self.stats,
+            workers=self.max_workers,
+            mode='process' if self.max_workers > 0 else 'thread',
+            pending=self.pending,
+            worker_pending=list(self.worker_pending),
+            max_queue=self.max_queue,
+            timeout_seconds=self.timeout,
+            avg_job_seconds=self.total_seconds / finished if finished else 0.0
+        )
+
+    def shutdown(self):
+        for pool in self.pools:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+# Incremental NDJSON / CSV parser feeding a TransactionBuffer
+class TransactionStreamParser:
+    formats = ('ndjson', 'csv')
+
+    def __init__(self, fmt: str = 'ndjson', max_rows: int = STREAM_MAX_ROWS):
+        if fmt not in self.formats:
+            raise ValueError(f"Unsupported stream format: {fmt}")
+        self.format = fmt
+        self.max_rows = max_rows
+        self.buffer = TransactionBuffer()
+        self.remainder = b''
+        self.header = None
+        self.line_number = 0
+
+    def feed(self, chunk: bytes):
+        """Parse every complete line in the chunk; a trailing partial line waits for the next one"""
+        lines = (self.remainder + chunk).split(b'\n')
+        self.remainder = lines.pop()
+        self.parse_lines(lines)
+
+    def close(self) -> TransactionBuffer:
+        if self.remainder.strip():
+            self.parse_lines([self.remainder])
+        self.remainder = b''
+        self.buffer.flush()
+        return self.buffer
+
+    def parse_lines(self, lines: List[bytes]):
+        lines = [line.decode('utf-8-sig' if self.line_number == 0 and index == 0 else 'utf-8').rstrip('\r')
+                 for index, line in enumerate(lines)]
+        if self.format == 'ndjson':
+            for line in lines:
+                self.line_number += 1
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON on line {self.line_number}: {e.msg}")
+                self.add(record)
+        else:
+            for row in csv.reader(lines):
+                self.line_number += 1
+                if not row:
+                    continue
+                if self.header is None:
+                    self.header = [name.strip() for name in row]
+                    continue
+                self.add(dict(zip(self.header, row)))
+
+    def add(self, record: Dict):
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {self.line_number} is not a transaction object")
+        if len(self.buffer) >= self.max_rows:
+            raise ValueError(f"Upload exceeds {self.max_rows} transactions")
+        self.buffer.append(record)
+
+# LRU of insight responses keyed by a content hash of the request inputs
+class InsightCache:
+    def __init__(self, max_entries: int = INSIGHT_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def content_key(*parts) -> str:
+        """Stable hash of JSON-like inputs; dict key order does not matter"""
+        payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result: Dict):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_not_modified(self):
+        with self.lock:
+            self.not_modified += 1
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
 
 # Initialize AI components
-categorizer = AdvancedCategorizer()
-insights_engine = InsightsEngine()
+merchant_dictionary = MerchantDictionary()
+categorizer = AdvancedCategorizer(merchant_dictionary)
+embedding_batcher = EmbeddingBatcher(categorizer.get_bert_embeddings)
+# Process-local engine; compute pool jobs run on it too when the pool is in thread mode
+insights_engine = get_insights_engine()
+insight_cache = InsightCache()
+compute_pool = ComputePool()
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    embedding_batcher.shutdown()
+    categorizer.embedding_cache.save()
+    categorizer.ann_index.save()
+    categorizer.store.close()
+    compute_pool.shutdown()
+    shutdown_compute_jobs()
+    receipt_jobs.shutdown()
 
 # Enhanced API Endpoints
 @app.get("/")
@@ -694,7 +2188,7 @@ async def root():
         ],
         "ai_status": {
             "bert_available": categorizer.bert_available,
-            "learning_data": len(categorizer.transaction_history)
+            "learning_data": categorizer.history_size()
         }
     }
 
@@ -702,10 +2196,17 @@ async def root():
 async def suggest_category(transaction: TransactionInput):
     """Enhanced category suggestion with AI"""
     try:
-        result = categorizer.advanced_categorize(
+        item_embedding = None
+        if categorizer.bert_available and transaction.type == 'expense':
+            item_embedding = await embedding_batcher.embed(transaction.item)
+        
+        result = await run_in_threadpool(
+            categorizer.advanced_categorize,
             transaction.item,
             transaction.amount,
-            transaction.type
+            transaction.type,
+            item_embedding,
+            transaction.user_id
         )
         
         return {
@@ -718,39 +2219,127 @@ async def suggest_category(transaction: TransactionInput):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Enhanced categorization failed: {str(e)}")
 
+@app.post("/api/suggest-categories")
+async def suggest_categories(data: BulkTransactionInput):
+    """Bulk category suggestion for statement imports"""
+    try:
+        start_time = time.perf_counter()
+        transactions = TransactionColumns.from_records([
+            {'item': t.item, 'amount': t.amount, 'type': t.type, 'user_id': t.user_id}
+            for t in data.transactions
+        ])
+        # Only the BERT pass goes through the inference thread; categorizing runs in the threadpool
+        embeddings = [None] * len(transactions)
+        expense_indices = categorizer.embedding_indices(transactions)
+        expense_embeddings = await embedding_batcher.embed_batch([transactions.items[i] for i in expense_indices])
+        for i, embedding in zip(expense_indices, expense_embeddings):
+            embeddings[i] = embedding
+        results = await run_in_threadpool(categorizer.advanced_categorize_batch, transactions, embeddings)
+        elapsed = time.perf_counter() - start_time
+        
+        return {
+            "suggestions": [
+                {
+                    "item": t.item,
+                    "suggested_category": result['category'],
+                    "confidence": result['confidence'],
+                    "reasoning": result['reasoning'],
+                    "anomaly_detected": result.get('anomaly_detected', False),
+                    "anomaly_score": result.get('anomaly_score', 0)
+                }
+                for t, result in zip(data.transactions, results)
+            ],
+            "total_processed": len(results),
+            "processing_time": elapsed,
+            "throughput": len(results) / elapsed if elapsed > 0 else 0
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Bulk categorization failed: {str(e)}")
+
 @app.post("/api/learn-transaction")
 async def learn_transaction(transaction: TransactionInput):
     """Learn from user corrections"""
     try:
-        categorizer.learn_from_transaction({
+        item_embedding = None
+        if categorizer.bert_available:
+            item_embedding = await embedding_batcher.embed(transaction.item)
+        
+        # SQLite writes and index updates stay off the event loop
+        await run_in_threadpool(categorizer.learn_from_transaction, {
             'item': transaction.item,
             'amount': transaction.amount,
             'category': transaction.category,
             'type': transaction.type,
-            'entryDate': transaction.entryDate
-        })
+            'entryDate': transaction.entryDate,
+            'user_id': transaction.user_id
+        }, item_embedding)
         
         return {
             "message": "Learning updated successfully",
-            "total_learned_transactions": len(categorizer.transaction_history)
+            "total_learned_transactions": categorizer.history_size()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Learning failed: {str(e)}")
 
+def get_request_transactions(data: Dict[str, Any]) -> TransactionColumns:
+    """Typed columns from the payload, or from the user's stored history when none are sent"""
+    transactions = data.get('transactions')
+    if transactions is None and data.get('user_id'):
+        return categorizer.store.get_columns(data['user_id'], data.get('start_date'), data.get('end_date'))
+    return TransactionColumns.from_records(transactions or [])
+
+def use_rollups(data: Dict[str, Any]) -> bool:
+    """Whole-history requests for a stored user are served from the materialized rollups"""
+    return (ROLLUPS_ENABLED and data.get('transactions') is None and bool(data.get('user_id'))
+            and not data.get('start_date') and not data.get('end_date'))
+
 @app.post("/api/advanced-insights")
-async def generate_insights(data: Dict[str, Any]):
+async def generate_insights(data: Dict[str, Any], request: Request, response: Response):
     """Generate advanced AI insights"""
     try:
-        transactions = data.get('transactions', [])
         budgets = data.get('budgets', {})
+        user_id = data.get('user_id', 'default')
         
-        insights = insights_engine.generate_advanced_insights(transactions, budgets)
+        # Rollup requests change only when the user learns a transaction, so the count stands in for the rows
+        if use_rollups(data):
+            transactions = None
+            key_source = ('rollups', user_id, categorizer.rollups.count(user_id))
+        else:
+            transactions = await run_in_threadpool(get_request_transactions, data)
+            key_source = ('transactions', user_id, transactions.fingerprint())
+        key = await run_in_threadpool(InsightCache.content_key, *key_source, budgets)
+        etag = f'"{key}"'
+        
+        # Insights are deterministic in their inputs, so a matching ETag needs no work at all
+        if etag in request.headers.get('if-none-match', ''):
+            insight_cache.record_not_modified()
+            return Response(status_code=304, headers={'ETag': etag})
+        response.headers['ETag'] = etag
+        
+        cached = insight_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        if transactions is None:
+            # Only the recent rows are read, for row-level anomaly flags
+            aggregates = await run_in_threadpool(categorizer.rollups.get_aggregates, user_id)
+            rows = await run_in_threadpool(
+                categorizer.store.recent, user_id, ROLLUP_RECENT_ROWS, 'item, amount, category, type, date AS entryDate'
+            )
+            recent = TransactionColumns.from_records([dict(row) for row in rows])
+            insights = await compute_pool.run(generate_insights_job, recent, budgets, user_id, aggregates, affinity=user_id)
+        else:
+            insights = await compute_pool.run(generate_insights_job, transactions, budgets, user_id, affinity=user_id)
         
-        return {
+        result = {
             "insights": insights,
             "generated_at": datetime.now().isoformat(),
             "total_insights": len(insights)
         }
+        insight_cache.put(key, result)
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Insights generation failed: {str(e)}")
 
@@ -758,15 +2347,28 @@ async def generate_insights(data: Dict[str, Any]):
 async def predict_spending(data: Dict[str, Any]):
     """Predict future spending"""
     try:
-        transactions = data.get('transactions', [])
         category = data.get('category', None)
         days_ahead = data.get('days_ahead', 30)
+        engine = data.get('engine', None)
         
-        prediction = insights_engine.predictor.predict_spending(
-            transactions, category, days_ahead
-        )
+        if engine not in (None, 'auto') and engine not in insights_engine.predictor.forecasters:
+            raise HTTPException(status_code=400, detail=f"Unknown forecast engine: {engine}")
+        
+        if use_rollups(data):
+            daily = await run_in_threadpool(categorizer.rollups.daily_series, data['user_id'], category)
+            prediction = await compute_pool.run(
+                predict_daily_spending_job, daily, category, days_ahead, data['user_id'], engine, affinity=data['user_id']
+            )
+        else:
+            transactions = await run_in_threadpool(get_request_transactions, data)
+            user_id = data.get('user_id', 'default')
+            prediction = await compute_pool.run(
+                predict_spending_job, transactions, category, days_ahead, user_id, engine, affinity=user_id
+            )
         
         return prediction
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
@@ -774,19 +2376,92 @@ async def predict_spending(data: Dict[str, Any]):
 async def detect_anomalies(data: Dict[str, Any]):
     """Detect spending anomalies"""
     try:
-        transactions = data.get('transactions', [])
+        transactions = await run_in_threadpool(get_request_transactions, data)
+        
+        if len(transactions) == 0:
+            return {"anomalies": [], "message": "No transactions to analyze"}
+        
+        insights = await compute_pool.run(detect_anomalies_job, transactions)
+        
+        return {
+            "anomalies": insights,
+            "total_transactions_analyzed": len(transactions),
+            "anomaly_count": len([i for i in insights if i['type'] == 'warning'])
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Anomaly detection failed: {str(e)}")
+
+async def read_transaction_stream(request: Request, fmt: str) -> TransactionColumns:
+    """Parse an NDJSON/CSV request body chunk by chunk into a columnar frame"""
+    try:
+        parser = TransactionStreamParser(fmt)
+        # Line decoding and the per-flush column conversions are CPU work; keep them off the event loop
+        async for chunk in request.stream():
+            await run_in_threadpool(parser.feed, chunk)
+        buffer = await run_in_threadpool(parser.close)
+        return await run_in_threadpool(buffer.to_columns)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid transaction stream: {str(e)}")
+
+@app.post("/api/advanced-insights/stream")
+async def generate_insights_stream(request: Request, format: str = 'ndjson', user_id: str = 'default',
+                                   budgets: Optional[str] = None):
+    """Generate advanced AI insights from a streamed NDJSON or CSV upload"""
+    try:
+        transactions = await read_transaction_stream(request, format)
+        budgets = json.loads(budgets) if budgets else {}
+        
+        insights = await compute_pool.run(generate_insights_job, transactions, budgets, user_id, affinity=user_id)
+        
+        return {
+            "insights": insights,
+            "generated_at": datetime.now().isoformat(),
+            "total_insights": len(insights),
+            "total_transactions_analyzed": len(transactions)
+        }
+    except HTTPException:
+        raise
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid budgets parameter: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Insights generation failed: {str(e)}")
+
+@app.post("/api/predict-spending/stream")
+async def predict_spending_stream(request: Request, format: str = 'ndjson', user_id: str = 'default',
+                                  category: Optional[str] = None, days_ahead: int = 30, engine: Optional[str] = None):
+    """Predict future spending from a streamed NDJSON or CSV upload"""
+    try:
+        if engine not in (None, 'auto') and engine not in insights_engine.predictor.forecasters:
+            raise HTTPException(status_code=400, detail=f"Unknown forecast engine: {engine}")
+        
+        transactions = await read_transaction_stream(request, format)
+        return await compute_pool.run(predict_spending_job, transactions, category, days_ahead, user_id, engine,
+                                      affinity=user_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+@app.post("/api/detect-anomalies/stream")
+async def detect_anomalies_stream(request: Request, format: str = 'ndjson'):
+    """Detect spending anomalies in a streamed NDJSON or CSV upload"""
+    try:
+        transactions = await read_transaction_stream(request, format)
         
-        if not transactions:
+        if len(transactions) == 0:
             return {"anomalies": [], "message": "No transactions to analyze"}
         
-        df = pd.DataFrame(transactions)
-        insights = insights_engine.detect_spending_anomalies(df)
+        insights = await compute_pool.run(detect_anomalies_job, transactions)
         
         return {
             "anomalies": insights,
             "total_transactions_analyzed": len(transactions),
             "anomaly_count": len([i for i in insights if i['type'] == 'warning'])
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Anomaly detection failed: {str(e)}")
 
@@ -795,12 +2470,25 @@ async def ai_status():
     """Get AI system status"""
     return {
         "bert_available": categorizer.bert_available,
-        "learning_data_size": len(categorizer.transaction_history),
+        "learning_data_size": categorizer.history_size(),
         "models_loaded": {
             "categorizer": True,
             "insights_engine": True,
             "predictor": True
         },
+        "embedding_batcher": embedding_batcher.get_stats(),
+        "embedding_cache": categorizer.embedding_cache.get_stats(),
+        "ann_index": categorizer.ann_index.get_stats(),
+        "user_states": categorizer.user_states.get_stats(),
+        "prophet_cache": compute_pool.get_prophet_cache_stats(),
+        "compute_pool": compute_pool.get_stats(),
+        "insight_cache": insight_cache.get_stats(),
+        "receipt_jobs": receipt_jobs.get_stats(),
+        "merchant_dictionary": merchant_dictionary.get_stats(),
+        "spending_rollups": {
+            "enabled": ROLLUPS_ENABLED,
+            "transactions": categorizer.rollups.count()
+        },
         "features": {
             "semantic_categorization": categorizer.bert_available,
             "anomaly_detection": True,
@@ -810,24 +2498,209 @@ async def ai_status():
         }
     }
 
-# Enhanced OCR with better preprocessing
-class EnhancedReceiptProcessor:
-    def __init__(self):
-        # Initialize with better patterns and preprocessing
-        self.amount_patterns = [
-        r'TOTAL[:\s]*\$?\s*(\d+\.\d{2})',
-        r'AMOUNT[:\s]*\$?\s*(\d+\.\d{2})',
-        r'SUBTOTAL[:\s]*\$?\s*(\d+\.\d{2})',
-        r'\$\s*(\d+\.\d{2})',
-        r'(\d+\.\d{2})'
-]
-
-        self.date_patterns = [
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'(\d{4}[/-]\d{1,2}[/-]\d{1,2})',
-            r'(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[^\d]*(\d{1,2})[^\d]*(\d{4})',
-            r'(\d{1,2})[^\d]+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[^\d]+(\d{4})'
-        ]
+# Single-pass extraction of amount, date and vendor candidates from OCR text
+class ReceiptScanner:
+    amount_keywords = re.compile(r'total|amount|due|balance')
+    date_formats = {
+        '/': ['%m/%d/%Y', '%Y/%m/%d', '%m/%d/%y', '%y/%m/%d'],
+        '-': ['%m-%d-%Y', '%Y-%m-%d', '%m-%d-%y', '%y-%m-%d'],
+        'month': ['%b %d %Y', '%B %d %Y', '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y']
+    }
+    months = r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)'
+    
+    # One alternation over the text for keyword/$/bare amounts (which never cross a line, as when
+    # matched line by line) and numeric dates. All are zero-width lookaheads so no token can hide
+    # another that starts inside it; scan() keeps each pattern's matches non-overlapping
+    token_pattern = re.compile(
+        r'(?=[\d$TA])(?=(?P<keyword>TOTAL|AMOUNT)[:\t\r\f\v ]*\$?[\t\r\f\v ]*(?P<keyword_amount>\d+\.\d{2})'
+        r'|\$[\t\r\f\v ]*(?P<dollar_amount>\d+\.\d{2})'
+        r'|(?P<amount>\d+\.\d{2})'
+        r'|(?P<date0>\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
+        r'|(?P<date1>\d{4}[/-]\d{1,2}[/-]\d{1,2}))',
+        re.IGNORECASE
+    )
+    # Rank mirrors the old pattern order: TOTAL (also inside SUBTOTAL), AMOUNT, $, bare number
+    amount_ranks = {'dollar_amount': 3, 'amount': 4}
+    date_groups = ('date0', 'date1')
+    # Month-name dates rank after numeric ones and their gaps make them slow to try at every
+    # position, so they are only scanned for when no numeric date parses
+    month_date_patterns = [
+        re.compile(rf'{months}[^\d]*\d{{1,2}}[^\d]*\d{{4}}', re.IGNORECASE),
+        re.compile(rf'\d{{1,2}}[^\d]+{months}[^\d]+\d{{4}}', re.IGNORECASE)
+    ]
+    digits = re.compile(r'\d')
+    date_cleanup = re.compile(r'[^\w\s/\-,]')
+    vendor_cleanup = re.compile(r'[^\w\s]')
+    number_cleanup = re.compile(r'\b\d+\b')
+
+    def __init__(self, vendor_categories: Dict[str, str], merchants: MerchantDictionary = None):
+        self.vendor_categories = vendor_categories
+        self.vendor_rank = {vendor: rank for rank, vendor in enumerate(vendor_categories)}
+        self.vendor_matcher = MultiPatternMatcher(vendor_categories)
+        self.merchants = merchants or MerchantDictionary(None)
+
+    def parse_date(self, text: str, group: str, window) -> Optional[str]:
+        if group in ('date0', 'date1'):
+            separators = set(self.digits.sub('', text))
+            if len(separators) != 1:
+                return None  # Mixed separators never matched a format
+            formats = self.date_formats[separators.pop()]
+        else:
+            formats = self.date_formats['month']
+        
+        clean_date = self.date_cleanup.sub('', text).strip()
+        for fmt in formats:
+            try:
+                parsed_date = datetime.strptime(clean_date, fmt)
+            except ValueError:
+                continue
+            # Validate date is reasonable (not too far in future/past)
+            if window[0] <= parsed_date <= window[1]:
+                return parsed_date.strftime('%Y-%m-%d')
+        return None
+
+    def scan(self, text: str) -> Dict:
+        """Best amount and date from one pass over the text, plus the vendor"""
+        line_count = text.count('\n') + 1
+        line_index = 0
+        line_start = 0
+        line_end = -1
+        line_has_keyword = False
+        
+        best_amount = None  # (score, -line, -rank, -position, amount)
+        dates = []  # (pattern rank, position, group, text)
+        match_ends = {}
+        
+        for match in self.token_pattern.finditer(text):
+            group = match.lastgroup
+            start = match.start()
+            
+            # Non-overlapping per pattern, like findall over each pattern separately
+            if start < match_ends.get(group, 0):
+                continue
+            match_ends[group] = match.end(group)
+            
+            if group in self.date_groups:
+                dates.append((self.date_groups.index(group), start, group, match.group(group)))
+                continue
+            
+            if start > line_end:
+                # First amount on a later line
+                line_index += text.count('\n', line_start, start)
+                line_start = text.rfind('\n', 0, start) + 1
+                line_end = text.find('\n', start)
+                if line_end < 0:
+                    line_end = len(text)
+                line_has_keyword = self.amount_keywords.search(text[line_start:line_end].lower()) is not None
+            
+            if group == 'keyword_amount':
+                rank = 0 if match.group('keyword')[0] in 'Tt' else 1
+            else:
+                rank = self.amount_ranks[group]
+            amount = float(match.group(group))
+            
+            # Score based on context
+            score = 0
+            if line_has_keyword:
+                score += 20  # Total/amount keywords
+            if line_index >= line_count * 0.7:
+                score += 10  # End of receipt
+            if 1 <= amount <= 10000:
+                score += 5  # Reasonable amount range
+            if amount > 0.5:
+                score += 3  # Not a tiny amount (likely not total)
+            
+            candidate = (score, -line_index, -rank, -match.start(group), amount)
+            if best_amount is None or candidate > best_amount:
+                best_amount = candidate
+        
+        # Dates in pattern-then-position order; the first that parses into the window wins
+        today = datetime.now()
+        window = (today - timedelta(days=365*2), today + timedelta(days=30))
+        best_date = None
+        for _, _, group, date_text in sorted(dates):
+            best_date = self.parse_date(date_text, group, window)
+            if best_date:
+                break
+        if best_date is None:
+            best_date = self.find_month_date(text, window)
+        
+        return {
+            'amount': best_amount[-1] if best_amount else None,
+            'date': best_date,
+            'vendor': self.find_vendor(text)
+        }
+
+    def find_month_date(self, text: str, window) -> Optional[str]:
+        for pattern in self.month_date_patterns:
+            for match in pattern.finditer(text):
+                parsed_date = self.parse_date(match.group(), 'month', window)
+                if parsed_date:
+                    return parsed_date
+        return None
+
+    def find_vendor(self, text: str) -> Optional[Dict]:
+        """Known vendor anywhere in the text, else a dictionary merchant, else a business-looking line near the top"""
+        text_lower = text.lower()
+        
+        # Every known vendor in one pass; the earliest-listed one wins, as before
+        found = self.vendor_matcher.find(text_lower)
+        if found:
+            vendor = min(found, key=self.vendor_rank.get)
+            return {
+                'name': vendor.title(),
+                'category': self.vendor_categories[vendor]
+            }
+        
+        merchants = self.merchants.find(text_lower)
+        if merchants:
+            return {
+                'name': merchants[0].title(),
+                'category': self.merchants.category(merchants[0])
+            }
+        
+        # Extract potential vendor from first few lines
+        lines = []
+        for line in text.split('\n'):
+            if line.strip():
+                lines.append(line.strip())
+                if len(lines) == 5:
+                    break
+        
+        for line in lines:
+            # Clean line of special characters and numbers
+            clean_line = self.vendor_cleanup.sub(' ', line).strip()
+            clean_line = self.number_cleanup.sub('', clean_line).strip()
+            
+            # Check if it looks like a business name
+            if (3 <= len(clean_line) <= 30 and 
+                not clean_line.lower() in ['receipt', 'store', 'customer', 'thank you'] and
+                len(clean_line.split()) <= 4):
+                
+                # Try to categorize using keywords
+                line_lower = clean_line.lower()
+                if any(word in line_lower for word in ['market', 'grocery', 'food', 'mart']):
+                    category = 'Grocery'
+                elif any(word in line_lower for word in ['gas', 'fuel', 'station']):
+                    category = 'Petrol'
+                elif any(word in line_lower for word in ['restaurant', 'cafe', 'grill', 'kitchen']):
+                    category = 'Food'
+                elif any(word in line_lower for word in ['fitness', 'gym', 'health']):
+                    category = 'Gym'
+                else:
+                    category = 'Extra'
+                
+                return {
+                    'name': clean_line.title(),
+                    'category': category
+                }
+        
+        return None
+
+# Receipt OCR plus amount, date and vendor parsing
+class EnhancedReceiptProcessor(ReceiptOCR):
+    def __init__(self, merchants: MerchantDictionary = None):
+        super().__init__()
         
         # Enhanced vendor detection with category mapping
         self.vendor_categories = {
@@ -841,89 +2714,7 @@ class EnhancedReceiptProcessor:
             'home depot': 'Home', 'lowes': 'Home', 'ikea': 'Home',
             'planet fitness': 'Gym', 'la fitness': 'Gym', 'gold gym': 'Gym'
         }
-
-    def advanced_preprocess(self, image_array):
-        """Advanced image preprocessing for better OCR"""
-        try:
-            # Convert to grayscale
-            if len(image_array.shape) == 3:
-                gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = image_array
-            
-            # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(gray)
-            
-            # Noise reduction using bilateral filter
-            denoised = cv2.bilateralFilter(enhanced, 9, 75, 75)
-            
-            # Morphological operations to clean up text
-            kernel = np.ones((1,1), np.uint8)
-            processed = cv2.morphologyEx(denoised, cv2.MORPH_CLOSE, kernel)
-            
-            # Adaptive thresholding
-            binary = cv2.adaptiveThreshold(
-                processed, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                cv2.THRESH_BINARY, 11, 2
-            )
-            
-            # Scale up for better OCR recognition
-            height, width = binary.shape
-            if width < 1200:
-                scale_factor = 1200 / width
-                new_width = int(width * scale_factor)
-                new_height = int(height * scale_factor)
-                binary = cv2.resize(binary, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-            
-            return binary
-            
-        except Exception as e:
-            print(f"Advanced preprocessing error: {e}")
-            return image_array
-
-    def extract_with_confidence(self, image_array):
-        """Extract text with confidence scores"""
-        try:
-            processed_image = self.advanced_preprocess(image_array)
-            
-            # Multiple OCR configurations for different text types
-            configs = [
-                r'--oem 3 --psm 6',  # Uniform block of text
-                r'--oem 3 --psm 8',  # Single word
-                r'--oem 3 --psm 7',  # Single text line
-                r'--oem 3 --psm 11', # Sparse text
-            ]
-            
-            best_result = ""
-            best_confidence = 0
-            
-            for config in configs:
-                try:
-                    # Get detailed OCR data with confidence
-                    data = pytesseract.image_to_data(
-                        processed_image, 
-                        config=config, 
-                        output_type=pytesseract.Output.DICT
-                    )
-                    
-                    # Calculate average confidence
-                    confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-                    if confidences:
-                        avg_confidence = sum(confidences) / len(confidences)
-                        if avg_confidence > best_confidence:
-                            best_confidence = avg_confidence
-                            best_result = pytesseract.image_to_string(processed_image, config=config)
-                    
-                except Exception as e:
-                    print(f"OCR config error: {e}")
-                    continue
-            
-            return best_result.strip(), best_confidence / 100.0
-            
-        except Exception as e:
-            print(f"OCR extraction error: {e}")
-            return "", 0.0
+        self.scanner = ReceiptScanner(self.vendor_categories, merchants)
 
     def smart_parse_receipt(self, text, confidence):
         """Smart parsing with AI-enhanced extraction"""
@@ -936,20 +2727,23 @@ class EnhancedReceiptProcessor:
             'suggested_category': 'Extra'
         }
         
+        # Amount, date and vendor candidates from a single scan of the text
+        scan = self.scanner.scan(text)
+        
         # Enhanced amount extraction
-        amount = self.extract_best_amount(text)
+        amount = scan['amount']
         if amount:
             result['amount'] = amount
             result['confidence'] += 0.4
         
         # Enhanced date extraction
-        date = self.extract_best_date(text)
+        date = scan['date']
         if date:
             result['date'] = date
             result['confidence'] += 0.2
         
         # Enhanced vendor extraction with AI categorization
-        vendor_info = self.extract_smart_vendor(text)
+        vendor_info = scan['vendor']
         if vendor_info:
             result['vendor'] = vendor_info['name']
             result['suggested_category'] = vendor_info['category']
@@ -968,128 +2762,222 @@ class EnhancedReceiptProcessor:
 
     def extract_best_amount(self, text):
         """Enhanced amount extraction with context awareness"""
-        lines = text.split('\n')
-        amount_candidates = []
-        
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            
-            for pattern in self.amount_patterns:
-                matches = re.findall(pattern, line, re.IGNORECASE)
-                for match in matches:
-                    try:
-                        amount = float(match)
-                        
-                        # Score based on context
-                        score = 0
-                        
-                        # Higher score for total/amount keywords
-                        if any(keyword in line_lower for keyword in ['total', 'amount', 'due', 'balance']):
-                            score += 20
-                        
-                        # Higher score for end of receipt
-                        if i >= len(lines) * 0.7:
-                            score += 10
-                        
-                        # Reasonable amount range
-                        if 1 <= amount <= 10000:
-                            score += 5
-                        
-                        # Not a tiny amount (likely not total)
-                        if amount > 0.5:
-                            score += 3
-                        
-                        amount_candidates.append((amount, score, line))
-                        
-                    except ValueError:
-                        continue
-        
-        if amount_candidates:
-            # Sort by score and return highest
-            amount_candidates.sort(key=lambda x: x[1], reverse=True)
-            return amount_candidates[0][0]
-        
-        return None
+        return self.scanner.scan(text)['amount']
 
     def extract_best_date(self, text):
         """Enhanced date extraction with multiple formats"""
-        for pattern in self.date_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                date_str = match.group()
-                
-                # Try to parse with multiple formats
-                date_formats = [
-                    '%m/%d/%Y', '%m-%d-%Y', '%Y/%m/%d', '%Y-%m-%d',
-                    '%m/%d/%y', '%m-%d-%y', '%y/%m/%d', '%y-%m-%d',
-                    '%b %d %Y', '%B %d %Y', '%d %b %Y', '%d %B %Y',
-                    '%b %d, %Y', '%B %d, %Y'
-                ]
-                
-                for fmt in date_formats:
-                    try:
-                        # Clean up the date string
-                        clean_date = re.sub(r'[^\w\s/\-,]', '', date_str)
-                        parsed_date = datetime.strptime(clean_date.strip(), fmt)
-                        
-                        # Validate date is reasonable (not too far in future/past)
-                        today = datetime.now()
-                        if (today - timedelta(days=365*2)) <= parsed_date <= (today + timedelta(days=30)):
-                            return parsed_date.strftime('%Y-%m-%d')
-                    except ValueError:
-                        continue
-        
-        return None
+        return self.scanner.scan(text)['date']
 
     def extract_smart_vendor(self, text):
         """Smart vendor extraction with AI enhancement"""
-        text_lower = text.lower()
-        
-        # Check known vendors first
-        for vendor, category in self.vendor_categories.items():
-            if vendor in text_lower:
-                return {
-                    'name': vendor.title(),
-                    'category': category
-                }
-        
-        # Extract potential vendor from first few lines
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        
-        for line in lines[:5]:  # Check first 5 lines
-            # Clean line of special characters and numbers
-            clean_line = re.sub(r'[^\w\s]', ' ', line).strip()
-            clean_line = re.sub(r'\b\d+\b', '', clean_line).strip()
-            
-            # Check if it looks like a business name
-            if (3 <= len(clean_line) <= 30 and 
-                not clean_line.lower() in ['receipt', 'store', 'customer', 'thank you'] and
-                len(clean_line.split()) <= 4):
-                
-                # Try to categorize using keywords
-                line_lower = clean_line.lower()
-                if any(word in line_lower for word in ['market', 'grocery', 'food', 'mart']):
-                    category = 'Grocery'
-                elif any(word in line_lower for word in ['gas', 'fuel', 'station']):
-                    category = 'Petrol'
-                elif any(word in line_lower for word in ['restaurant', 'cafe', 'grill', 'kitchen']):
-                    category = 'Food'
-                elif any(word in line_lower for word in ['fitness', 'gym', 'health']):
-                    category = 'Gym'
-                else:
-                    category = 'Extra'
-                
-                return {
-                    'name': clean_line.title(),
-                    'category': category
-                }
-        
-        return None
+        return self.scanner.find_vendor(text)
 
 # Initialize enhanced OCR processor
-enhanced_ocr = EnhancedReceiptProcessor()
+enhanced_ocr = EnhancedReceiptProcessor(merchant_dictionary)
+
+# Parse results of recent receipt images, found by their bytes or, when enabled, by a perceptual hash
+class ReceiptCache:
+    def __init__(self, max_entries: int = RECEIPT_CACHE_SIZE, ttl: float = RECEIPT_CACHE_TTL,
+                 max_distance: int = RECEIPT_CACHE_MAX_DISTANCE):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self.max_distance = max(0, max_distance)
+        self.entries = OrderedDict()  # sha256 -> (created, fingerprint or None, result)
+        self.pending = {}  # sha256 -> future of the upload being processed, used on the event loop only
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def image_key(image_data: bytes) -> str:
+        return hashlib.sha256(image_data).hexdigest()
+
+    @staticmethod
+    def fingerprint(image_data: bytes) -> Optional[tuple]:
+        """256-bit DCT perceptual hash and aspect ratio; None when the bytes are not an image"""
+        # Reduced decoding lets JPEGs skip most of the full-resolution work
+        gray = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if gray is None:
+            return None
+        small = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA).astype(np.float32)
+        low = cv2.dct(small)[:16, :16].flatten()
+        bits = np.packbits(low > np.median(low[1:]))  # The DC term would skew the median
+        return int.from_bytes(bits.tobytes(), 'big'), gray.shape[1] / gray.shape[0]
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Result for these exact image bytes"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self.entries[key]
+                self.expirations += 1
+                return None
+            self.entries.move_to_end(key)
+            self.exact_hits += 1
+            return dict(entry[2])
+
+    def get_similar(self, key: str, fingerprint: tuple) -> Optional[Dict]:
+        """Result for a near-identical image (the same photo resized or re-encoded), stored under key too"""
+        image_hash, aspect = fingerprint
+        now = time.time()
+        with self.lock:
+            best_key = None
+            best_distance = self.max_distance + 1
+            for cached_key, (created, cached_fingerprint, _) in list(self.entries.items()):
+                if now - created > self.ttl:
+                    del self.entries[cached_key]
+                    self.expirations += 1
+                    continue
+                if cached_fingerprint is None:
+                    continue
+                cached_hash, cached_aspect = cached_fingerprint
+                # Different receipts can share a layout; a different shape rules a match out cheaply
+                if abs(cached_aspect - aspect) > 0.02 * aspect:
+                    continue
+                distance = bin(cached_hash ^ image_hash).count('1')
+                if distance < best_distance:
+                    best_key = cached_key
+                    best_distance = distance
+            
+            if best_key is None:
+                return None
+            created, _, result = self.entries[best_key]
+            self.entries.move_to_end(best_key)
+            self.near_hits += 1
+        
+        # Keep the original creation time so the alias expires with the result it points to
+        self.put(key, fingerprint, result, created)
+        return dict(result)
+
+    def put(self, key: str, fingerprint: Optional[tuple], result: Dict, created: float = None):
+        if not self.max_entries:
+            return
+        with self.lock:
+            self.entries[key] = (created or time.time(), fingerprint, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_coalesced(self):
+        with self.lock:
+            self.coalesced += 1
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            hits = self.exact_hits + self.near_hits + self.coalesced
+            return {
+                'enabled': self.max_entries > 0,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'near_duplicates': self.max_distance > 0,
+                'max_distance': self.max_distance,
+                'in_progress': len(self.pending),
+                'exact_hits': self.exact_hits,
+                'near_hits': self.near_hits,
+                'coalesced': self.coalesced,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': hits / (hits + self.misses) if hits + self.misses else 0.0
+            }
+
+receipt_cache = ReceiptCache()
 
 # Updated OCR endpoints
+async def process_receipt_image(image_data: bytes) -> Dict:
+    """OCR and parse one receipt, reusing results for repeated images; raises HTTPException for unusable images"""
+    if not receipt_cache.max_entries:
+        return await ocr_receipt_image(image_data)
+    
+    key = receipt_cache.image_key(image_data)
+    cached = receipt_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    # The same bytes already in progress (double taps, client retries) share that result
+    pending = receipt_cache.pending.get(key)
+    if pending is not None:
+        receipt_cache.record_coalesced()
+        try:
+            return dict(await asyncio.shield(pending))
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise
+            # The first upload was abandoned before finishing; start over
+            return await process_receipt_image(image_data)
+    
+    pending = asyncio.get_running_loop().create_future()
+    receipt_cache.pending[key] = pending
+    try:
+        fingerprint = None
+        result = None
+        if receipt_cache.max_distance:
+            fingerprint = await run_in_threadpool(receipt_cache.fingerprint, image_data)
+            if fingerprint is None:
+                raise HTTPException(status_code=400, detail="Invalid image file")
+            result = receipt_cache.get_similar(key, fingerprint)
+        
+        if result is None:
+            receipt_cache.record_miss()
+            result = await ocr_receipt_image(image_data)
+            # Failed parses are not kept so a retry gets a fresh attempt
+            if result['success']:
+                receipt_cache.put(key, fingerprint, result)
+        pending.set_result(result)
+        return dict(result)
+    except asyncio.CancelledError:
+        pending.cancel()
+        raise
+    except Exception as e:
+        pending.set_exception(e)
+        pending.exception()  # Retrieved here so an unawaited failure is not logged again
+        raise
+    finally:
+        receipt_cache.pending.pop(key, None)
+
+async def ocr_receipt_image(image_data: bytes) -> Dict:
+    # Decoding and enhanced OCR extraction run in the compute pool
+    ocr_result = await compute_pool.run(receipt_ocr_job, image_data)
+    if ocr_result is None:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    text, ocr_confidence = ocr_result
+    
+    if not text:
+        return {
+            "success": False,
+            "message": "No text found in image",
+            "data": None
+        }
+    
+    # Smart parsing with AI
+    receipt_data = await run_in_threadpool(enhanced_ocr.smart_parse_receipt, text, ocr_confidence)
+    
+    return {
+        "success": True,
+        "message": "Receipt processed with enhanced AI",
+        "data": {
+            "vendor": receipt_data.get('vendor', ''),
+            "amount": receipt_data.get('amount', 0),
+            "date": receipt_data.get('date', ''),
+            "suggested_category": receipt_data.get('suggested_category', 'Extra'),
+            "confidence": receipt_data.get('confidence', 0),
+            "ocr_confidence": ocr_confidence,
+            "raw_text": receipt_data.get('raw_text', '')[:300] + "..." if len(receipt_data.get('raw_text', '')) > 300 else receipt_data.get('raw_text', '')
+        }
+    }
+
 @app.post("/api/process-receipt")
 async def process_receipt_enhanced(file: UploadFile = File(...)):
     """Enhanced receipt processing with better AI"""
@@ -1098,43 +2986,163 @@ async def process_receipt_enhanced(file: UploadFile = File(...)):
     
     try:
         image_data = await file.read()
-        nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            raise HTTPException(status_code=400, detail="Invalid image file")
-        
-        # Enhanced OCR extraction
-        text, ocr_confidence = enhanced_ocr.extract_with_confidence(image)
-        
-        if not text:
-            return {
-                "success": False,
-                "message": "No text found in image",
-                "data": None
-            }
-        
-        # Smart parsing with AI
-        receipt_data = enhanced_ocr.smart_parse_receipt(text, ocr_confidence)
-        
-        return {
-            "success": True,
-            "message": "Receipt processed with enhanced AI",
-            "data": {
-                "vendor": receipt_data.get('vendor', ''),
-                "amount": receipt_data.get('amount', 0),
-                "date": receipt_data.get('date', ''),
-                "suggested_category": receipt_data.get('suggested_category', 'Extra'),
-                "confidence": receipt_data.get('confidence', 0),
-                "ocr_confidence": ocr_confidence,
-                "raw_text": receipt_data.get('raw_text', '')[:300] + "..." if len(receipt_data.get('raw_text', '')) > 300 else receipt_data.get('raw_text', '')
-            }
-        }
+        return await process_receipt_image(image_data)
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Enhanced receipt processing error: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing receipt: {str(e)}")
 
+# Limits how many receipts from batch uploads are in the compute pool at once, leaving room for other requests
+receipt_slots = asyncio.Semaphore(max(1, RECEIPT_BATCH_CONCURRENCY))
+
+async def read_receipt_uploads(files: List[UploadFile]) -> List[Dict]:
+    if len(files) > RECEIPT_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {RECEIPT_BATCH_MAX_FILES} receipts per request")
+    # Read up front: the uploads are closed once the endpoint returns, before results are streamed
+    return [
+        {'filename': file.filename, 'content_type': file.content_type or '', 'image_data': await file.read()}
+        for file in files
+    ]
+
+async def process_receipt_upload(index: int, upload: Dict) -> Dict:
+    """One receipt of a batch; failures become a per-file result instead of failing the batch"""
+    async with receipt_slots:
+        try:
+            if not upload['content_type'].startswith('image/'):
+                raise HTTPException(status_code=400, detail="File must be an image")
+            result = await process_receipt_image(upload['image_data'])
+            result['status_code'] = 200
+        except HTTPException as e:
+            result = {"success": False, "message": e.detail, "data": None, "status_code": e.status_code}
+        except Exception as e:
+            print(f"Enhanced receipt processing error: {e}")
+            result = {"success": False, "message": f"Error processing receipt: {str(e)}", "data": None, "status_code": 500}
+    return dict(result, index=index, filename=upload['filename'])
+
+@app.post("/api/process-receipts")
+async def process_receipts(files: List[UploadFile] = File(...)):
+    """Process many receipts; one NDJSON result line per file, in completion order"""
+    uploads = await read_receipt_uploads(files)
+    
+    async def stream_results():
+        tasks = [asyncio.create_task(process_receipt_upload(index, upload)) for index, upload in enumerate(uploads)]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield json.dumps(await next_result, default=str) + "\n"
+        finally:
+            # Client went away: stop receipts that have not started yet
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+# Background receipt batches that clients poll by job id
+class ReceiptJobStore:
+    def __init__(self, max_jobs: int = RECEIPT_JOB_MAX, ttl: float = RECEIPT_JOB_TTL):
+        self.max_jobs = max(1, max_jobs)
+        self.ttl = ttl
+        self.jobs = OrderedDict()
+        self.tasks = {}
+        self.stats = {'created': 0, 'completed': 0, 'expired': 0, 'rejected': 0}
+
+    def evict(self):
+        """Drop expired finished jobs, then the oldest finished ones while over the limit"""
+        now = time.time()
+        finished = [job_id for job_id, job in self.jobs.items() if job['finished_at'] is not None]
+        for job_id in finished:
+            if now - self.jobs[job_id]['finished_at'] > self.ttl or len(self.jobs) >= self.max_jobs:
+                del self.jobs[job_id]
+                self.stats['expired'] += 1
+
+    def create(self, uploads: List[Dict]) -> Dict:
+        self.evict()
+        if len(self.jobs) >= self.max_jobs:
+            self.stats['rejected'] += 1
+            raise HTTPException(status_code=429, detail="Too many receipt jobs in progress, please retry shortly")
+        
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'status': 'queued',
+            'total': len(uploads),
+            'completed': 0,
+            'results': [],
+            'created_at': time.time(),
+            'finished_at': None
+        }
+        self.jobs[job['job_id']] = job
+        self.stats['created'] += 1
+        
+        task = asyncio.create_task(self.run(job, uploads))
+        self.tasks[job['job_id']] = task
+        task.add_done_callback(lambda _: self.tasks.pop(job['job_id'], None))
+        return job
+
+    async def run(self, job: Dict, uploads: List[Dict]):
+        job['status'] = 'running'
+        tasks = [asyncio.create_task(process_receipt_upload(index, upload)) for index, upload in enumerate(uploads)]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                job['results'].append(await next_result)
+                job['completed'] += 1
+            job['status'] = 'completed'
+            self.stats['completed'] += 1
+        except asyncio.CancelledError:
+            job['status'] = 'cancelled'
+            for task in tasks:
+                task.cancel()
+        finally:
+            job['finished_at'] = time.time()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        self.evict()
+        return self.jobs.get(job_id)
+
+    def get_stats(self) -> Dict:
+        return dict(
+            self.stats,
+            jobs=len(self.jobs),
+            running=len(self.tasks),
+            max_jobs=self.max_jobs,
+            ttl_seconds=self.ttl
+        )
+
+    def shutdown(self):
+        for task in list(self.tasks.values()):
+            task.cancel()
+
+receipt_jobs = ReceiptJobStore()
+
+@app.post("/api/process-receipts/jobs")
+async def create_receipt_job(files: List[UploadFile] = File(...)):
+    """Start processing many receipts in the background and return a job id to poll"""
+    uploads = await read_receipt_uploads(files)
+    job = receipt_jobs.create(uploads)
+    
+    return {
+        "job_id": job['job_id'],
+        "status": job['status'],
+        "total": job['total'],
+        "status_url": f"/api/process-receipts/jobs/{job['job_id']}"
+    }
+
+@app.get("/api/process-receipts/jobs/{job_id}")
+async def get_receipt_job(job_id: str, since: int = 0):
+    """Job progress; pass since=<results already seen> to fetch only new results"""
+    job = receipt_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Receipt job not found or expired")
+    
+    return {
+        "job_id": job['job_id'],
+        "status": job['status'],
+        "total": job['total'],
+        "completed": job['completed'],
+        "results": job['results'][max(0, since):],
+        "next_since": len(job['results'])
+    }
+
 # Background task for model training
 @app.post("/api/retrain-models")
 async def retrain_models(background_tasks: BackgroundTasks):
@@ -1145,14 +3153,16 @@ async def retrain_models(background_tasks: BackgroundTasks):
             print("Starting model retraining...")
             
             # Retrain categorization model if enough data
-            if len(categorizer.transaction_history) > 100:
-                # Update TF-IDF vectorizer with new data
-                descriptions = [t['item'] for t in categorizer.transaction_history]
-                categorizer.tfidf_vectorizer.fit(descriptions)
-                
-                # Save updated vectorizer
-                with open('tfidf_vectorizer.pkl', 'wb') as f:
-                    pickle.dump(categorizer.tfidf_vectorizer, f)
+            if categorizer.history_size() > 100:
+                # Recompute TF-IDF weights over the whole history
+                categorizer.user_states.rebuild_text_indexes()
+            
+            # Recompute the materialized rollups from the stored rows
+            categorizer.rollups.rebuild()
+            
+            # Index any learned transactions that have no embedding yet
+            backfilled = categorizer.backfill_ann_index()
+            print(f"ANN index backfilled with {backfilled} transactions")
             
             print("Model retraining completed")
             
@@ -1164,7 +3174,7 @@ async def retrain_models(background_tasks: BackgroundTasks):
     return {
         "message": "Model retraining started in background",
         "estimated_time": "2-3 minutes",
-        "data_points": len(categorizer.transaction_history)
+        "data_points": categorizer.history_size()
     }
 
 # Health check endpoint
@@ -1179,12 +3189,13 @@ async def health_check():
             "insights_engine": "operational",
             "ocr_processor": "operational",
             "bert_model": "operational" if categorizer.bert_available else "offline",
-            "learning_data": f"{len(categorizer.transaction_history)} transactions"
+            "learning_data": f"{categorizer.history_size()} transactions"
         },
         "memory_usage": {
-            "learning_data_size": len(categorizer.transaction_history),
+            "learning_data_size": categorizer.history_size(),
             "models_loaded": 4 if categorizer.bert_available else 3
-        }
+        },
+        "receipt_cache": receipt_cache.get_stats()
     }
 
 if __name__ == "__main__":
@@ -1197,6 +3208,10 @@ if __name__ == "__main__":
     print("- Pattern recognition and learning")
     print("- Budget optimization recommendations")
     
+    # Spawned and forkserver pool workers re-import the launching script unless it names another
+    # module; point them at compute_jobs so they never rebuild the API components
+    sys.modules['__main__'].__spec__ = importlib.util.find_spec('compute_jobs')
+    
     uvicorn.run(
         app, 
         host="0.0.0.0", 